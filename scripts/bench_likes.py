@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Case, When, F
+
+from store.models import Book, UserBookRelation
+from store.seeding import check_scratch_database
+from store.views import BookViewSet
+
+
+# Compares the old Count(Case(When)) list query with the likes_count column at the 1M relation rows the
+# column was asked for. Seeding takes minutes and everything is rolled back afterwards, `database` names the
+# throwaway database it runs in (see store.seeding.check_scratch_database):
+# python manage.py runscript bench_likes --script-args relations=1000000 books=10000 repeat=5 database=books_db
+# On PostgreSQL 16, 1M relations over 10000 books, all 10000 rows listed:
+#   count(case(when)): best 379.4ms, avg 475.9ms
+#   likes_count: best 32.3ms, avg 33.2ms
+def run(*args):
+    options = {'relations': 1000000, 'books': 10000, 'repeat': 5, 'database': None}
+    for key, value in (arg.split('=') for arg in args):
+        options[key] = value if key == 'database' else int(value)
+    check_scratch_database(options['database'], option='database=')
+    users_count = max(options['relations'] // options['books'], 1)
+
+    with transaction.atomic():
+        users = User.objects.bulk_create([User(username=f'bench_user_{i}') for i in range(users_count)])
+        books = Book.objects.bulk_create([
+            Book(name=f'Bench book {i}', price=random.randint(100, 900), author_name=f'Author {i % 100}')
+            for i in range(options['books'])
+        ])
+        relations = (UserBookRelation(user=user, book=book, like=random.random() < 0.3)
+                     for user in users for book in books)
+        UserBookRelation.objects.bulk_create(relations, batch_size=10000)
+        print(f'Seeded {UserBookRelation.objects.count()} relations for {len(books)} books')
+
+        # readers prefetch is the same for both variants, only the list query itself is compared
+        annotated = Book.objects.annotate(
+            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1))),
+            price_w_discount=Case(When(discount=True, then=F('price') - 100), default=F('price')),
+            owner_name=F('owner__username')
+        )
+        queries = {
+            'count(case(when))': annotated.order_by('id').values('id', 'price_w_discount', 'annotated_likes'),
+            'likes_count': BookViewSet.queryset.prefetch_related(None).values('id', 'price_w_discount', 'likes_count'),
+        }
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - start)
+            print(f'{name}: best {min(timings) * 1000:.1f}ms, avg {sum(timings) / len(timings) * 1000:.1f}ms')
+
+        transaction.set_rollback(True)
@@ -0,0 +1,57 @@
+import io
+import random
+import time
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from store.renderers import ORJSONParser, ORJSONRenderer, orjson
+from store.seeding import NAMES, WORDS
+
+
+def book(rng, i, readers):
+    price = rng.randint(10000, 90000)
+    discount = rng.random() < 0.2
+    return {
+        'id': i,
+        'name': ' '.join(rng.sample(WORDS, 3)),
+        'price': f'{price / 100:.2f}',
+        'price_w_discount': f'{(price - 10000 * discount) / 100:.2f}',
+        'author_name': f'Author {rng.randint(1, 1000)}',
+        'annotated_likes': rng.randint(0, 500),
+        'rating': f'{rng.uniform(1, 5):.2f}' if rng.random() < 0.8 else None,
+        'owner_name': f'user{rng.randint(1, 1000)}',
+        'readers': [{'first_name': rng.choice(NAMES), 'last_name': f'{rng.choice(NAMES)}ov'}
+                    for _ in range(rng.randint(0, readers))],
+    }
+
+
+def best(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+# python manage.py runscript bench_renderer --script-args books=10000 readers=5 repeat=20
+def run(*args):
+    options = {'books': 10000, 'readers': 5, 'repeat': 20}
+    options.update({key: int(value) for key, value in (arg.split('=') for arg in args)})
+    rng = random.Random(0)
+    # the shape of a /book/ list response as BooksSerializer produces it
+    data = {'next': 'http://localhost:8000/book/?cursor=eyJvIjpbImlkIl0sInYiOlsxMDBdfQ%3D%3D',
+            'results': [book(rng, i, options['readers']) for i in range(options['books'])]}
+    print(f'orjson {"installed" if orjson else "missing, ORJSON* fall back to the stock classes"}')
+
+    stock, content = best(lambda: JSONRenderer().render(data), options['repeat'])
+    fast, fast_content = best(lambda: ORJSONRenderer().render(data), options['repeat'])
+    assert content == fast_content, 'renderers disagree'
+    print(f'render {options["books"]} books, {len(content) / 1024:.0f} KiB: JSONRenderer {stock * 1000:.1f}ms, '
+          f'ORJSONRenderer {fast * 1000:.1f}ms, {stock / fast:.1f}x')
+
+    stock, parsed = best(lambda: JSONParser().parse(io.BytesIO(content)), options['repeat'])
+    fast, fast_parsed = best(lambda: ORJSONParser().parse(io.BytesIO(content)), options['repeat'])
+    assert parsed == fast_parsed, 'parsers disagree'
+    print(f'parse: JSONParser {stock * 1000:.1f}ms, ORJSONParser {fast * 1000:.1f}ms, {stock / fast:.1f}x')
@@ -0,0 +1,54 @@
+import random
+import time
+
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.models import Book
+from store.search import BookSearchFilter
+from store.seeding import check_scratch_database
+from store.views import BookViewSet
+
+WORDS = ['python', 'django', 'rest', 'guide', 'patterns', 'data', 'web', 'design', 'fluent', 'deep', 'learning',
+         'systems', 'modern', 'practical', 'effective', 'clean', 'code', 'architecture', 'testing', 'cookbook']
+AUTHORS = ['Matthes', 'Ramalho', 'Beazley', 'Lutz', 'Slatkin', 'Percival', 'Greenfeld', 'Vincent', 'Hunt', 'Martin']
+
+
+class IcontainsViewSet(BookViewSet):
+    search_fields = ['name', 'author_name']
+
+
+# everything is rolled back afterwards, `database` names the throwaway database it runs in
+# python manage.py runscript bench_search --script-args books=1000000 repeat=5 database=books_db
+def run(*args):
+    options = {'books': 1000000, 'repeat': 5, 'database': None}
+    for key, value in (arg.split('=') for arg in args):
+        options[key] = value if key == 'database' else int(value)
+    check_scratch_database(options['database'], option='database=')
+    factory = APIRequestFactory()
+
+    with transaction.atomic():
+        for start in range(0, options['books'], 10000):
+            Book.objects.bulk_create([
+                Book(name=' '.join(random.sample(WORDS, 3)), price=random.randint(100, 900),
+                     author_name=f'{random.choice(AUTHORS)} {i}')
+                for i in range(start, min(start + 10000, options['books']))
+            ])
+        print(f'Seeded {options["books"]} books')
+
+        for term in ('python', 'fluent design', 'ramalho', 'nothing'):
+            request = Request(factory.get('/book/', {'search': term}))
+            for backend, view in ((SearchFilter, IcontainsViewSet), (BookSearchFilter, BookViewSet)):
+                timings = []
+                for _ in range(options['repeat']):
+                    queryset = backend().filter_queryset(request, BookViewSet.queryset.prefetch_related(None), view())
+                    start = time.perf_counter()
+                    # first page, as the list endpoint reads it
+                    found = len(queryset.values('id')[:100])
+                    timings.append(time.perf_counter() - start)
+                print(f'{backend.__name__} "{term}": {found} rows, best {min(timings) * 1000:.1f}ms, '
+                      f'avg {sum(timings) / len(timings) * 1000:.1f}ms')
+
+        transaction.set_rollback(True)
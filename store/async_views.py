@@ -0,0 +1,152 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.views import View
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
+from rest_framework.exceptions import (APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound,
+                                       PermissionDenied)
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.request import Request
+
+from .instrumentation import timer
+from .listing import listing_queryset
+from .logic import upsert_relation
+from .models import Book
+from .pagination import KeysetPagination
+from .permissions import IsOwnerOrStaffOrReadOnly
+from .renderers import ORJSONParser, ORJSONRenderer
+from .replicas import ais_pinned, primary_reads, replica_reads
+from .rows import RowQuerysetMixin
+from .serializers import BooksRowSerializer, UserBookRelationSerializer, UserBookRelationUpdateSerializer
+from .views import BookViewSet, annotate_my_relation
+
+
+class AsyncAPIView(View):
+    # A small DRF-like view for ASGI. Handlers are coroutines, the user comes from request.auser() and the
+    # database is only reached through the async ORM, so under ASGI a request holds no thread while it waits.
+    # Errors are rendered like DRF's exception handler. Sessions are the only authentication, so unlike DRF's
+    # views these aren't CSRF exempt and CsrfViewMiddleware checks the token as SessionAuthentication would.
+    permission_classes = ()
+    renderer_class = ORJSONRenderer
+    parser_classes = (ORJSONParser,)
+
+    async def dispatch(self, request, *args, **kwargs):
+        # a Request without authenticators, `query_params` and `data` work as in DRF views
+        self.request = request = Request(request, parsers=[parser() for parser in self.parser_classes],
+                                         authenticators=())
+        request.user = await request._request.auser()
+        try:
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise MethodNotAllowed(request.method)
+            self.check_permissions(request)
+            # safe requests read from a replica like BookViewSet, unless the user has just written something
+            if request.method in SAFE_METHODS and not await ais_pinned(request.user):
+                reads = replica_reads()
+            else:
+                reads = primary_reads()
+            with reads:
+                return await handler(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    def check_permissions(self, request):
+        for permission in self.get_permissions():
+            if not permission.has_permission(request, self):
+                self.permission_denied(request, getattr(permission, 'message', None))
+
+    def check_object_permissions(self, request, obj):
+        # the permissions compare loaded fields only, so they run in the event loop
+        for permission in self.get_permissions():
+            if not permission.has_object_permission(request, self, obj):
+                self.permission_denied(request, getattr(permission, 'message', None))
+
+    def get_permissions(self):
+        return [permission() for permission in self.permission_classes]
+
+    def permission_denied(self, request, message=None):
+        if not request.user.is_authenticated:
+            raise NotAuthenticated()
+        raise PermissionDenied(detail=message)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            # as in DRF's APIView: without an authenticator sending WWW-Authenticate (sessions only) it's a 403
+            exc.status_code = status.HTTP_403_FORBIDDEN
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return self.render(data, exc.status_code)
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        with timer('render'):
+            content = self.renderer_class().render(data)
+        return HttpResponse(content, status=status_code, content_type=self.renderer_class.media_type)
+
+
+class AsyncBookMixin(RowQuerysetMixin):
+    # the rows BookViewSet serves on list/retrieve, built by the same queryset and row serializer
+    permission_classes = [IsOwnerOrStaffOrReadOnly]
+    row_serializer_class = BookViewSet.row_serializer_class
+    row_extra_fields = BookViewSet.row_extra_fields
+
+    def get_queryset(self):
+        if settings.BOOK_LISTING:
+            return listing_queryset(self.request.user)
+        queryset = BookViewSet.queryset.all()
+        if self.request.user.is_authenticated:
+            queryset = annotate_my_relation(queryset, self.request.user)
+        return queryset
+
+
+class AsyncBookListView(AsyncBookMixin, AsyncAPIView):
+    # /book/ list with `price` filter, `ordering` and cursor pagination, `search` stays with BookViewSet
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = BookViewSet.filterset_fields
+    ordering_fields = BookViewSet.ordering_fields
+    pagination_class = KeysetPagination
+
+    def filter_queryset(self, queryset):
+        # the backends only build the queryset, nothing is read until the page is
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    async def get(self, request):
+        paginator = self.pagination_class()
+        queryset = self.get_row_queryset(self.filter_queryset(self.get_queryset()))
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        data = await BooksRowSerializer(page, many=True).adata()
+        return self.render(paginator.get_paginated_data(data))
+
+
+class AsyncBookDetailView(AsyncBookMixin, AsyncAPIView):
+    async def get(self, request, pk):
+        try:
+            row = await self.get_row_queryset(self.get_queryset()).aget(pk=pk)
+        except ObjectDoesNotExist:
+            raise NotFound()
+        self.check_object_permissions(request, row)
+        return self.render(await BooksRowSerializer(row).adata())
+
+
+class AsyncUserBookRelationView(AsyncAPIView):
+    # PUT/PATCH /book_relation/<book>/ of the current user, the relation and its book counters are saved
+    # in one hop to a thread by store.logic.upsert_relation
+    permission_classes = [IsAuthenticated]
+
+    async def put(self, request, book):
+        return await self.update(request, book, partial=False)
+
+    async def patch(self, request, book):
+        return await self.update(request, book, partial=True)
+
+    async def update(self, request, book, partial):
+        serializer = UserBookRelationUpdateSerializer(data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        try:
+            relation, _ = await sync_to_async(upsert_relation)(request.user, book, serializer.validated_data)
+        except Book.DoesNotExist:
+            raise NotFound()
+        return self.render(UserBookRelationSerializer(relation).data)
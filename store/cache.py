@@ -0,0 +1,122 @@
+from hashlib import sha1
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+EPOCH_KEY = 'store:books:epoch'
+LIST_VERSION_KEY = 'store:books:list'
+BOOK_VERSION_KEY = 'store:books:book:{}'
+SEARCH_VERSION_KEY = 'store:books:search'
+HITS_KEY = 'store:books:hits'
+MISSES_KEY = 'store:books:misses'
+
+# sent with the ids of changed books, or None when any book may have changed, before the post-commit bump
+books_changed = Signal()
+
+
+# Cached responses are never deleted. Keys embed version tokens and a write replaces the tokens,
+# so old entries simply stop being addressed and expire on their own.
+def _bump(keys):
+    cache.set_many({key: uuid4().hex for key in keys}, timeout=None)
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    for key, version in missing.items():
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+        versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def get_version(key):
+    return _versions([key])[0]
+
+
+def invalidate_books(book_ids):
+    book_ids = set(book_ids)
+    keys = [LIST_VERSION_KEY] + [BOOK_VERSION_KEY.format(book_id) for book_id in book_ids]
+    _bump(keys)
+    books_changed.send(sender=None, book_ids=book_ids)
+    # bumped again after commit, so a read racing with the transaction can't keep the old data addressed
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_all():
+    _bump([EPOCH_KEY])
+    books_changed.send(sender=None, book_ids=None)
+    transaction.on_commit(lambda: _bump([EPOCH_KEY]))
+
+
+def invalidate_search():
+    # only name/author_name changes matter to the in-process search index, likes and rates don't
+    _bump([SEARCH_VERSION_KEY])
+    transaction.on_commit(lambda: _bump([SEARCH_VERSION_KEY]))
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': stats.get(HITS_KEY, 0), 'misses': stats.get(MISSES_KEY, 0)}
+
+
+def response_cache_key(request, version_keys, vary=''):
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    versions = _versions([EPOCH_KEY] + version_keys)
+    raw = repr((request.get_host(), request.path, params, vary, versions))
+    return f'store:books:response:{sha1(raw.encode()).hexdigest()}'
+
+
+class CachedResponseMixin:
+    # Caches list/retrieve response data. Any Book, UserBookRelation or reader/owner User change
+    # replaces the version tokens in store.signals, and the key includes filter/search/ordering/cursor params.
+    def get_vary_key(self, request):
+        # one entry shared by everyone, views serializing per user data return a key of the user
+        return ''
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(request, [LIST_VERSION_KEY], self.get_vary_key(request))
+        return self.cached_response(key, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        book_key = BOOK_VERSION_KEY.format(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        key = response_cache_key(request, [book_key], self.get_vary_key(request))
+        return self.cached_response(key, super().retrieve, request, *args, **kwargs)
+
+    def get_cache_timeout(self):
+        return settings.BOOK_CACHE_TIMEOUT
+
+    def cached_response(self, key, view, request, *args, **kwargs):
+        cached = cache.get(key)
+        if cached is not None:
+            _incr(HITS_KEY)
+            data, headers = cached
+            response = Response(data, headers=headers)
+            # validators are cached with the data, so a matching If-None-Match costs no query at all
+            not_modified = get_conditional_response(
+                request, etag=headers.get('ETag'), last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+                response=response
+            )
+            return response if not_modified is None else not_modified
+
+        _incr(MISSES_KEY)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {name: response[name] for name in ('ETag', 'Last-Modified') if name in response}
+            cache.set(key, (response.data, headers), self.get_cache_timeout())
+        return response
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL_CACHES = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    # Writes invalidate cached book responses by replacing version tokens in the default cache (store.cache),
+    # replica pins live there too. Other worker processes only see them in a cache they share.
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    message = (f'The default cache {backend} is local to every process, other worker processes keep serving '
+               f'cached books a write has invalidated.')
+    hint = ('Use a cache shared by the workers: FileBasedCache on a single host, RedisCache or PyMemcacheCache '
+            'across hosts. Or silence this check for a deployment with a single worker process.')
+    if settings.DEBUG:
+        return [Warning(message, hint=hint, id='store.W001')]
+    return [Error(message, hint=hint, id='store.E001')]
@@ -0,0 +1,86 @@
+import time
+from hashlib import sha1
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+
+
+def make_etag(*parts):
+    return '"%s"' % sha1(repr(parts).encode()).hexdigest()
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def is_conditional(request):
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+class ConditionalGetMixin:
+    # Answers If-None-Match / If-Modified-Since with 304 before the serializer runs.
+    # Validators come from Book.version / Book.modified_at, which every change of the serialized book bumps.
+    def list(self, request, *args, **kwargs):
+        if is_conditional(request):
+            # the same page as the real response, but only ids, versions and ordering values are read
+            queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values()
+            page = self.paginator.paginate_queryset(queryset, request, view=self)
+            etag, last_modified = self.get_list_validators(request, page)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return set_validators(not_modified, etag, last_modified)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, *self.get_list_validators(request, self.paginator.page))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if is_conditional(request):
+            book = self.get_queryset().model.objects.filter(pk=kwargs[self.lookup_url_kwarg or self.lookup_field])
+            row = book.values('pk', 'version', 'modified_at').first()
+            if row is not None:
+                etag, last_modified = self.get_detail_validators(request, row)
+                not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if not_modified is not None:
+                    return set_validators(not_modified, etag, last_modified)
+
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and getattr(self, 'object', None) is not None:
+            row = {field: self._get(self.object, field) for field in ('pk', 'version', 'modified_at')}
+            set_validators(response, *self.get_detail_validators(request, row))
+        return response
+
+    def get_object(self):
+        self.object = super().get_object()
+        return self.object
+
+    def get_vary_key(self, request):
+        return ''
+
+    def get_list_validators(self, request, page):
+        # the page is fully defined by its rows' versions and by whether a next page exists
+        rows = [(self._get(obj, 'pk'), self._get(obj, 'version')) for obj in page]
+        params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+        etag = make_etag(request.path, params, self.get_vary_key(request), rows, self.paginator.get_next_link())
+        # no Last-Modified: a book leaving the page doesn't make the page any newer
+        return etag, None
+
+    def get_detail_validators(self, request, row):
+        etag = make_etag(request.path, row['pk'], row['version'], self.get_vary_key(request))
+        # HTTP dates have whole seconds, so a second write within the second of the last one would keep the date
+        # and If-Modified-Since alone would get a 304 for stale content. The date is the end of that second and
+        # only given once it's over, every later write then ends a later second. The ETag has no such gap.
+        last_modified = int(row['modified_at'].timestamp()) + 1
+        if last_modified > time.time():
+            last_modified = None
+        return etag, last_modified
+
+    def _get(self, obj, field):
+        if isinstance(obj, dict):
+            return obj['id' if field == 'pk' else field]
+        return getattr(obj, field)
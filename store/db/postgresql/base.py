@@ -0,0 +1,49 @@
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+from store.pooling import get_pool
+
+from .creation import DatabaseCreation
+
+# psycopg.pq.TransactionStatus / psycopg2.extensions.TRANSACTION_STATUS_*, the same in both
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_UNKNOWN = 4
+
+
+def check(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return True
+
+
+def reset(connection):
+    # a returned connection goes back idle, outside of a transaction, a broken one is closed
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # PostgreSQL with connections from a store.pooling.ConnectionPool configured by the POOL dict of the
+    # database settings. Django still "connects" and "closes" around every request with CONN_MAX_AGE 0,
+    # which only checks a warm connection out of the pool and back in.
+    creation_class = DatabaseCreation
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        # conn_params decide what the pooled connections are connected to, tests switching to the test
+        # database get a new pool
+        self.pool = get_pool(self.alias, repr(sorted(conn_params.items())), self.settings_dict.get('POOL', {}),
+                             check=check, reset=reset)
+        return self.pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # closed inside an atomic block, the wrapper keeps referencing the connection, so it isn't shared
+                self.pool.putconn(self.connection, close=self.in_atomic_block)
@@ -0,0 +1,14 @@
+from django.db.backends.postgresql import creation
+
+from store.pooling import close_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # idle pooled connections keep the test database in use, which blocks DROP DATABASE and cloning it
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pool(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pool(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
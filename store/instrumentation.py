@@ -0,0 +1,163 @@
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency histogram in milliseconds, the last bucket takes everything slower
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+TIMINGS = ('db', 'serialize', 'render', 'total')
+
+_current = ContextVar('store_request_metrics', default=None)
+_lock = threading.Lock()
+_routes = {}
+
+
+@contextmanager
+def timer(name):
+    # adds the elapsed time to the metrics of the request being handled, a no-op outside of one
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics[name] += perf_counter() - start
+
+
+class TimedSerializerMixin:
+    # `.data` is where the view pays for to_representation of the whole instance or page
+    @property
+    def data(self):
+        with timer('serialize'):
+            return super().data
+
+
+def record(route, metrics):
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = {'count': 0, 'queries': 0, 'max_queries': 0, 'budget_breaches': 0,
+                                      **{name: 0.0 for name in TIMINGS},
+                                      'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+        stats['count'] += 1
+        stats['queries'] += metrics['queries']
+        stats['max_queries'] = max(stats['max_queries'], metrics['queries'])
+        stats['budget_breaches'] += metrics['over_budget']
+        for name in TIMINGS:
+            stats[name] += metrics[name]
+        stats['buckets'][bisect_left(LATENCY_BUCKETS, metrics['total'] * 1000)] += 1
+
+
+def metrics_snapshot():
+    # totals are in seconds, averages and buckets in milliseconds
+    with _lock:
+        routes = {route: {**stats, 'buckets': list(stats['buckets'])} for route, stats in _routes.items()}
+    for stats in routes.values():
+        stats['avg_queries'] = stats['queries'] / stats['count']
+        stats.update({f'avg_{name}_ms': stats[name] * 1000 / stats['count'] for name in TIMINGS})
+        stats['buckets'] = dict(zip([*map(str, LATENCY_BUCKETS), '+Inf'], stats['buckets']))
+    return routes
+
+
+def reset_metrics():
+    with _lock:
+        _routes.clear()
+
+
+class InstrumentationMiddleware:
+    # Per route SQL count/time, serializer and render time. Sent as a Server-Timing header,
+    # aggregated in-process for MetricsView and checked against settings.QUERY_BUDGETS.
+    # Cheap enough to stay on: a perf_counter() pair per query and one locked dict update per request.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = {'queries': 0, 'over_budget': 0, **{name: 0.0 for name in TIMINGS}}
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            with self.count_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = {'queries': 0, 'over_budget': 0, **{name: 0.0 for name in TIMINGS}}
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            # connections are per thread and the async ORM queries in the request's thread sensitive thread,
+            # so the wrappers are added there
+            stack = await sync_to_async(self.count_queries)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def count_queries(self):
+        # the wrappers are installed right away, closing the stack removes them
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self.count_query))
+        return stack
+
+    def finish(self, request, response, metrics, start):
+        metrics['total'] = perf_counter() - start
+        if 'render_start' in metrics:
+            metrics['render'] = metrics.pop('render_end', start + metrics['total']) - metrics.pop('render_start')
+
+        match = request.resolver_match
+        if match is not None:
+            route = match.view_name or match.route
+            budget = getattr(settings, 'QUERY_BUDGETS', {}).get(route)
+            if budget is not None and metrics['queries'] > budget:
+                metrics['over_budget'] = 1
+                logger.warning('Query budget exceeded for %s %s: %d queries, budget %d',
+                               request.method, route, metrics['queries'], budget)
+            record(route, metrics)
+
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics["db"] * 1000:.1f};desc="{metrics["queries"]} queries"',
+                *(f'{name};dur={metrics[name] * 1000:.1f}' for name in TIMINGS[1:]),
+            ])
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook, inside the view's get_response
+        metrics = _current.get()
+        if metrics is not None:
+            metrics['render_start'] = perf_counter()
+            response.add_post_render_callback(lambda rendered: metrics.__setitem__('render_end', perf_counter()))
+        return response
+
+    def count_query(self, execute, sql, params, many, context):
+        metrics = _current.get()
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if metrics is not None:
+                metrics['queries'] += 1
+                metrics['db'] += perf_counter() - start
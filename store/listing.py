@@ -0,0 +1,103 @@
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, Exists, F, Min, OuterRef, Subquery, Value, When
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from .models import Book, BookListing, UserBookRelation
+
+# books refreshed per INSERT ... SELECT, so an `IN` list never grows past this
+REFRESH_CHUNK_SIZE = 1000
+
+
+def price_w_discount():
+    return Case(When(discount=True, then=F('price') - 100), default=F('price'))
+
+
+# BookListing columns and how they are computed from Book, the list row of BookViewSet
+LISTING_COLUMNS = {
+    'id': F('id'),
+    'name': F('name'),
+    'price': F('price'),
+    'price_w_discount': price_w_discount(),
+    'author_name': F('author_name'),
+    'likes_count': F('likes_count'),
+    'rating': F('rating'),
+    'owner_id': F('owner_id'),
+    'owner_name': F('owner__username'),
+    'version': F('version'),
+    'modified_at': F('modified_at'),
+    'refreshed_at': Now(),
+}
+
+
+def _insert_select(cursor, book_ids=None, upsert=False):
+    # INSERT INTO store_booklisting (...) SELECT ... FROM store_book, the rows never leave the database
+    books = Book.objects.order_by()
+    if book_ids is not None:
+        books = books.filter(pk__in=book_ids)
+    names = {column: f'listing_{column}' for column in LISTING_COLUMNS}
+    books = books.annotate(**{names[column]: expression for column, expression in LISTING_COLUMNS.items()})
+    select, params = books.values_list(*names.values()).query.get_compiler(connection=cursor.db).as_sql()
+
+    ops = cursor.db.ops
+    columns = [BookListing._meta.get_field(column).column for column in LISTING_COLUMNS]
+    sql = f'INSERT INTO {ops.quote_name(BookListing._meta.db_table)} ({", ".join(map(ops.quote_name, columns))}) '
+    sql += select
+    if upsert:
+        sql += ' ' + ops.on_conflict_suffix_sql(columns, OnConflict.UPDATE, columns[1:], columns[:1])
+    cursor.execute(sql, params)
+
+
+def refresh_listings(book_ids=None):
+    # Brings the BookListing rows of `book_ids` (all books when None) up to date with their books, rows of
+    # deleted books are removed. Called by store.signals after the commit of every change of a listed book.
+    using = router.db_for_write(BookListing)
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if book_ids is None:
+            BookListing.objects.using(using).all().delete()
+            _insert_select(cursor)
+            return
+
+        book_ids = sorted(set(book_ids))
+        for start in range(0, len(book_ids), REFRESH_CHUNK_SIZE):
+            chunk = book_ids[start:start + REFRESH_CHUNK_SIZE]
+            if connection.features.supports_update_conflicts_with_target:
+                # existing rows are updated in place and only rows of deleted books are removed
+                _insert_select(cursor, chunk, upsert=True)
+                BookListing.objects.using(using).filter(pk__in=chunk).exclude(
+                    pk__in=Book.objects.using(using).filter(pk__in=chunk).values('pk')).delete()
+            else:
+                BookListing.objects.using(using).filter(pk__in=chunk).delete()
+                _insert_select(cursor, chunk)
+
+
+def listing_queryset(user):
+    # the rows BookViewSet lists and retrieves with settings.BOOK_LISTING, `my_*` of signed in users are
+    # looked up per row on the unique (user, book) index
+    queryset = BookListing.objects.order_by('id')
+    if user.is_authenticated:
+        relation = UserBookRelation.objects.filter(book_id=OuterRef('pk'), user=user)
+        queryset = queryset.annotate(
+            my_like=Coalesce(Subquery(relation.values('like')[:1]), Value(False)),
+            my_bookmark=Coalesce(Subquery(relation.values('in_bookmarks')[:1]), Value(False)),
+            my_rate=Subquery(relation.values('rate')[:1]),
+        )
+    return queryset
+
+
+def listing_stats():
+    # `stale` books have no listing row or one of an older version, `lag` is how long the oldest of them
+    # has waited for its refresh in seconds. Read from the primary, a replica's own lag isn't counted.
+    using = router.db_for_write(BookListing)
+    current = BookListing.objects.using(using).filter(pk=OuterRef('pk'), version=OuterRef('version'))
+    stale = Book.objects.using(using).filter(~Exists(current)).aggregate(count=Count('pk'),
+                                                                         oldest=Min('modified_at'))
+    orphaned = BookListing.objects.using(using).filter(~Exists(Book.objects.filter(pk=OuterRef('pk'))))
+    return {
+        'rows': BookListing.objects.using(using).count(),
+        'stale': stale['count'],
+        'orphaned': orphaned.count(),
+        'lag': (timezone.now() - stale['oldest']).total_seconds() if stale['oldest'] is not None else 0.0,
+    }
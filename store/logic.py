@@ -1,10 +1,238 @@
-from django.db.models import Avg
+from decimal import Decimal
 
-from store.models import UserBookRelation
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Avg, Count, F, FloatField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Now, Round
+from django.utils import timezone
+
+from store.cache import invalidate_books
+from store.models import Book, DirtyBookRating, UserBookRelation
+from store.replicas import replica_reads
 
 
 def set_rating(book):
-    rating = UserBookRelation.objects.filter(book=book).aggregate(rating=Avg('rate')).get('rating')
-    book.rating = rating
-    book.save()
+    rebuild_counters(book_ids=[book.pk])
+    invalidate_books([book.pk])
+    book.refresh_from_db(fields=['rating', 'rating_sum', 'rating_count', 'likes_count'])
+
+
+def _touch():
+    return {'version': F('version') + 1, 'modified_at': Now()}
+
+
+def touch_books(book_ids):
+    Book.objects.filter(pk__in=book_ids).update(**_touch())
+    invalidate_books(book_ids)
+
+
+def update_counters(book_id, old_like=False, new_like=False, old_rate=None, new_rate=None, touch=False):
+    # O(1) update of denormalized counters, the book row is never re-aggregated
+    updates = _touch() if touch else {}
+    if new_like != old_like:
+        updates['likes_count'] = F('likes_count') + (1 if new_like else -1)
+
+    sum_delta = (new_rate or 0) - (old_rate or 0)
+    count_delta = (new_rate is not None) - (old_rate is not None)
+    if (sum_delta or count_delta) and settings.RATING_UPDATE_MODE == 'deferred':
+        mark_rating_dirty(book_id)
+    elif sum_delta or count_delta:
+        rating_sum = F('rating_sum') + sum_delta
+        rating_count = F('rating_count') + count_delta
+        updates.update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            # the right side of UPDATE sees old values, so the new average is computed from the same deltas
+            rating=Cast(rating_sum, FloatField()) / NullIf(rating_count, 0)
+        )
+
+    if updates:
+        updates.update(_touch())
+        Book.objects.filter(pk=book_id).update(**updates)
+
+
+def _counter_subqueries(book_ids=None):
+    relations = UserBookRelation.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    if book_ids is not None:
+        # constants PostgreSQL prunes the hash partitions of the relations by before running anything,
+        # see migration 0019, `book = OuterRef` alone is only pruned per execution of the subquery
+        relations = relations.filter(book_id__in=book_ids)
+    rates = relations.filter(rate__isnull=False)
+    return {
+        'likes_count': Coalesce(Subquery(relations.filter(like=True).annotate(total=Count('pk')).values('total')), 0),
+        'rating_sum': Coalesce(Subquery(rates.annotate(total=Sum('rate')).values('total')), 0),
+        'rating_count': Coalesce(Subquery(rates.annotate(total=Count('pk')).values('total')), 0),
+        'rating': Subquery(rates.annotate(average=Avg('rate')).values('average')),
+    }
+
+
+def _books(books, book_ids):
+    if books is None:
+        books = Book.objects.all()
+    if book_ids is not None:
+        books = books.filter(pk__in=book_ids)
+    return books
+
+
+def rebuild_counters(books=None, book_ids=None):
+    # `book_ids` limits `books` to these ids and the relations read to their partitions
+    return _books(books, book_ids).update(**_counter_subqueries(book_ids), **_touch())
+
+
+def rebuild_ratings(books=None, book_ids=None):
+    books = _books(books, book_ids)
+    counters = _counter_subqueries(book_ids)
+    return books.update(**{name: counters[name] for name in ('rating_sum', 'rating_count', 'rating')}, **_touch())
+
+
+def inconsistent_books(books=None):
+    if books is None:
+        books = Book.objects.all()
+    counters = _counter_subqueries()
+    expected = {f'expected_{name}': counters[name] for name in ('likes_count', 'rating_sum', 'rating_count')}
+    # the average as the two decimals of the column stores it, -1 on both sides for a book without rates
+    no_rating = Value(Decimal(-1))
+    expected['expected_rating'] = Coalesce(Round(counters['rating'], 2), no_rating,
+                                           output_field=Book._meta.get_field('rating'))
+    return books.annotate(**expected, stored_rating=Coalesce('rating', no_rating)).exclude(
+        likes_count=F('expected_likes_count'),
+        rating_sum=F('expected_rating_sum'),
+        rating_count=F('expected_rating_count'),
+        stored_rating=F('expected_rating'),
+    )
+
+
+def mark_rating_dirty(book_id):
+    # marked after commit, so the worker never recomputes before the relation is visible
+    transaction.on_commit(
+        lambda: DirtyBookRating.objects.bulk_create([DirtyBookRating(book_id=book_id)], ignore_conflicts=True)
+    )
+
+
+def flush_dirty_ratings(batch_size=1000):
+    with transaction.atomic():
+        book_ids = list(DirtyBookRating.objects.select_for_update(skip_locked=True)
+                        .order_by('marked_at').values_list('book_id', flat=True)[:batch_size])
+        if book_ids:
+            # marks made after this point create new rows and are picked by the next flush
+            DirtyBookRating.objects.filter(book_id__in=book_ids).delete()
+            rebuild_ratings(book_ids=book_ids)
+            invalidate_books(book_ids)
+    return len(book_ids)
+
+
+def rating_queue_stats():
+    with replica_reads():
+        stats = DirtyBookRating.objects.aggregate(depth=Count('book_id'), oldest=Min('marked_at'))
+    lag = (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0.0
+    return {'depth': stats['depth'], 'lag': lag}
+
+
+RELATION_FIELDS = ('like', 'in_bookmarks', 'rate', 'comments')
+
+
+def upsert_relations(user, items):
+    # items are validated {'book': id, ...} dicts, omitted fields keep their stored values.
+    # One read, one INSERT .. ON CONFLICT and one counters rebuild per touched book, whatever the batch size.
+    with transaction.atomic():
+        book_ids = {item['book'] for item in items}
+        relations = {relation.book_id: relation
+                     for relation in UserBookRelation.objects.filter(user=user, book_id__in=book_ids)}
+        created = book_ids - set(relations)
+        for item in items:
+            relation = relations.setdefault(item['book'], UserBookRelation(user=user, book_id=item['book']))
+            for field in RELATION_FIELDS:
+                if field in item:
+                    setattr(relation, field, item[field])
+        # stored rows are matched by the (user, book) conflict target, without pks the batch is a single INSERT
+        for relation in relations.values():
+            relation.pk = None
+        UserBookRelation.objects.bulk_create(relations.values(), update_conflicts=True,
+                                             unique_fields=['user', 'book'], update_fields=RELATION_FIELDS)
+    return {'created': len(created), 'updated': len(book_ids) - len(created)}
+
+
+def _upsert_relation_sql(fields):
+    # `old` locks and reads the stored row, `new` inserts or updates it, both by the (user, book) key.
+    # `new` only updates a row `old` has seen: one inserted by a concurrent request after this statement's
+    # snapshot isn't visible to `old`, the statement then returns nothing and is repeated.
+    quote = connection.ops.quote_name
+    table = quote(UserBookRelation._meta.db_table)
+    relation_fields = [UserBookRelation._meta.get_field(name) for name in RELATION_FIELDS]
+    columns = ', '.join(quote(field.column) for field in relation_fields)
+    # typed, an untyped NULL of INSERT .. SELECT would be text
+    values = ', '.join(f'CAST(%s AS {field.cast_db_type(connection)})' for field in relation_fields)
+    updates = ', '.join(f'{quote(field.column)} = EXCLUDED.{quote(field.column)}'
+                        for field in relation_fields if field.name in fields)
+    return (
+        f'WITH old AS MATERIALIZED ('
+        f'SELECT {columns} FROM {table} WHERE user_id = %s AND book_id = %s FOR UPDATE'
+        f'), new AS ('
+        f'INSERT INTO {table} (user_id, book_id, {columns}) '
+        f'SELECT %s, %s, {values} WHERE EXISTS (SELECT 1 FROM {quote(Book._meta.db_table)} WHERE id = %s) '
+        f'ON CONFLICT (user_id, book_id) DO UPDATE SET {updates or "user_id = EXCLUDED.user_id"} '
+        f'WHERE EXISTS (SELECT 1 FROM old) '
+        f'RETURNING id, {columns}'
+        f') SELECT new.*, old.* FROM new LEFT JOIN old ON true'
+    )
+
+
+def upsert_relation(user, book_id, data):
+    # The relation of `user` to a book set to the validated `data`, omitted fields keep their stored values.
+    # Returns (relation, created) or raises Book.DoesNotExist. On PostgreSQL that's one INSERT .. ON CONFLICT
+    # DO UPDATE .. RETURNING with the stored row locked and read by the same statement, plus the counters
+    # UPDATE of the book: concurrent requests of a user can't duplicate the row or miscount likes and rates.
+    if connection.vendor != 'postgresql':
+        return _save_relation(user, book_id, data)
+
+    relation_fields = [UserBookRelation._meta.get_field(name) for name in RELATION_FIELDS]
+    values = [field.get_db_prep_save(data[field.name] if field.name in data else field.get_default(), connection)
+              for field in relation_fields]
+    with transaction.atomic(), connection.cursor() as cursor:
+        while True:
+            cursor.execute(_upsert_relation_sql(data), [user.pk, book_id, user.pk, book_id, *values, book_id])
+            row = cursor.fetchone()
+            if row is not None:
+                break
+            if not Book.objects.filter(pk=book_id).exists():
+                raise Book.DoesNotExist(f'Book {book_id} does not exist.')
+
+        stored = dict(zip(RELATION_FIELDS, row[1:5]))
+        old = dict(zip(RELATION_FIELDS, row[5:9]))
+        created = old['like'] is None
+        relation = UserBookRelation.from_db(connection.alias, ['id', 'user_id', 'book_id', *RELATION_FIELDS],
+                                            [row[0], user.pk, book_id, *stored.values()])
+        if created:
+            old = {'like': False, 'in_bookmarks': False, 'rate': None}
+        # what UserBookRelation.save() does, a new relation adds a reader and a bookmark is serialized
+        update_counters(book_id, old['like'], relation.like, old['rate'], relation.rate,
+                        touch=created or old['in_bookmarks'] != relation.in_bookmarks)
+        invalidate_books([book_id])
+    return relation, created
+
 
+def _save_relation(user, book_id, data):
+    # Elsewhere the row is locked where the database can and written like UserBookRelation.save() would, without
+    # its savepoint. The book is only looked up for a new relation: its foreign key is deferred, a missing book
+    # would fail at the commit of the request's transaction, long after the response.
+    created = False
+    with transaction.atomic(savepoint=False):
+        relations = UserBookRelation.objects.select_for_update()
+        relation = relations.filter(user=user, book_id=book_id).first()
+        if relation is None and Book.objects.filter(pk=book_id).exists():
+            relation, created = relations.get_or_create(user=user, book_id=book_id)
+        if relation is not None:
+            # a created relation has already been counted as a reader by its save()
+            old_like, old_rate, old_in_bookmarks = relation.like, relation.rate, relation.in_bookmarks
+            if data:
+                # a plain QuerySet, the relation queryset would rebuild the counters updated just below
+                models.QuerySet(UserBookRelation).filter(pk=relation.pk, book_id=book_id).update(**data)
+                for field, value in data.items():
+                    setattr(relation, field, value)
+            update_counters(book_id, old_like, relation.like, old_rate, relation.rate,
+                            touch=old_in_bookmarks != relation.in_bookmarks)
+            invalidate_books([book_id])
+    # raised outside the transaction, which stays usable for the caller
+    if relation is None:
+        raise Book.DoesNotExist(f'Book {book_id} does not exist.')
+    return relation, created
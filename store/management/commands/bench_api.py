@@ -0,0 +1,154 @@
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from store.instrumentation import metrics_snapshot, reset_metrics
+from store.pooling import pool_stats
+from store.seeding import check_scratch_database, delete_seeded, seed
+
+
+def get_list(client, rng, dataset):
+    return client.get(reverse('book-list'), data={'page_size': dataset['page_size']})
+
+
+def get_detail(client, rng, dataset):
+    return client.get(reverse('book-detail', args=(rng.choice(dataset['books']),)))
+
+
+def get_search(client, rng, dataset):
+    return client.get(reverse('book-list'), data={'search': rng.choice(['python', 'data', 'web guide', 'clean co'])})
+
+
+def patch_relation(client, rng, dataset):
+    data = {'like': rng.random() < 0.5, 'rate': rng.randint(1, 5)}
+    return client.patch(reverse('userbookrelation-detail', args=(rng.choice(dataset['books']),)),
+                        data=json.dumps(data), content_type='application/json')
+
+
+SCENARIOS = {
+    'list': get_list,
+    'detail': get_detail,
+    'search': get_search,
+    'relation': patch_relation,
+}
+
+
+def percentile(latencies, percent):
+    # nearest rank of sorted latencies
+    if not latencies:
+        return None
+    return latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset, drive the store endpoints in-process with the test client at several '
+            'concurrency levels and print RPS, latency percentiles and queries per request as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--relations', type=int, default=10, help='Relations per user')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed gives the same dataset and requests')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario and concurrency level')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests before every scenario')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--no-response-cache', action='store_true',
+                            help='Measure every request without the book response cache')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded dataset after the run')
+        parser.add_argument('--output', help='Write the JSON report to a file instead of stdout')
+        parser.add_argument('--database', help='Name of the default database, confirming that it is a throwaway one. '
+                                               'Required unless it is the database of a test run')
+
+    def handle(self, *args, **options):
+        check_scratch_database(options['database'])
+        # leftovers of an interrupted run would change the dataset
+        delete_seeded()
+        start = perf_counter()
+        dataset = seed(users=options['users'], books=options['books'], relations=options['relations'],
+                       seed=options['seed'])
+        dataset['page_size'] = options['page_size']
+        seeded = perf_counter() - start
+
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if options['no_response_cache']:
+            overrides['BOOK_CACHE_TIMEOUT'] = 0
+        try:
+            with override_settings(**overrides):
+                results = [self.run_level(name, level, dataset, options)
+                           for name in options['scenarios'] for level in options['concurrency']]
+        finally:
+            if not options['keep']:
+                delete_seeded()
+
+        report = json.dumps({
+            'database': connection.vendor,
+            'dataset': {name: options[name] for name in ('users', 'books', 'relations', 'seed', 'page_size')},
+            'seed_seconds': round(seeded, 3),
+            'response_cache': not options['no_response_cache'],
+            'results': results,
+            # after all levels, waits and timeouts tell whether the pool was the bottleneck
+            'connection_pools': pool_stats(),
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def run_level(self, name, level, dataset, options):
+        self.run_worker(name, dataset, count(), options['warmup'], options['seed'])
+        reset_metrics()
+        counter = count()
+        start = perf_counter()
+        if level == 1:
+            # in the calling thread, so an outer transaction (e.g. of a test) sees the same data
+            workers = [self.run_worker(name, dataset, counter, options['requests'], options['seed'])]
+        else:
+            with ThreadPoolExecutor(level) as pool:
+                workers = list(pool.map(lambda i: self.run_worker(name, dataset, counter, options['requests'],
+                                                                  options['seed'] + i, threaded=True),
+                                        range(level)))
+        elapsed = perf_counter() - start
+
+        latencies = sorted(latency for worker in workers for latency in worker['latencies'])
+        routes = metrics_snapshot().values()
+        requests = sum(stats['count'] for stats in routes)
+        return {
+            'scenario': name,
+            'concurrency': level,
+            'requests': len(latencies),
+            'errors': sum(worker['errors'] for worker in workers),
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+            **{f'p{percent}_ms': round(percentile(latencies, percent) * 1000, 2) if latencies else None
+               for percent in (50, 95, 99)},
+            'queries_per_request': round(sum(stats['queries'] for stats in routes) / requests, 2) if requests else None,
+        }
+
+    def run_worker(self, name, dataset, counter, requests, worker_seed, threaded=False):
+        # requests are shared by all workers of a level, `next()` of itertools.count is atomic
+        rng = random.Random(worker_seed)
+        client = Client(raise_request_exception=False)
+        if name == 'relation':
+            client.force_login(User.objects.get(pk=rng.choice(dataset['users'])))
+        latencies, errors = [], 0
+        try:
+            while next(counter) < requests:
+                start = perf_counter()
+                response = SCENARIOS[name](client, rng, dataset)
+                latencies.append(perf_counter() - start)
+                errors += response.status_code >= 400
+        finally:
+            if threaded:
+                connections.close_all()
+        return {'latencies': latencies, 'errors': errors}
@@ -0,0 +1,130 @@
+import json
+import random
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from store.logic import set_rating, upsert_relation
+from store.management.commands.bench_api import percentile
+from store.models import Book, UserBookRelation
+from store.partitioning import relation_partitions, scanned_partitions
+from store.seeding import PREFIX, check_scratch_database, delete_seeded, seed
+from store.views import annotate_my_relation
+
+
+def rate_book(rng, dataset, options):
+    set_rating(Book(pk=rng.choice(dataset['books'])))
+
+
+def list_my_relation(rng, dataset, options):
+    # a list page with the LEFT JOIN of BookViewSet for a signed in user, starting at a random book. The books
+    # come from the outer query, so partitions are only pruned at run time, per joined book.
+    books = Book.objects.filter(pk__gte=rng.choice(dataset['books'])).order_by('id')
+    user = User(pk=rng.choice(dataset['users']))
+    list(annotate_my_relation(books, user).values('id', 'my_like', 'my_rate')[:options['page_size']])
+
+
+def get_or_create_relation(rng, dataset, options):
+    # what UserBookRelationView.get_object does, mostly creating since every user reads a few books only
+    UserBookRelation.objects.get_or_create(user_id=rng.choice(dataset['users']),
+                                           book_id=rng.choice(dataset['books']))
+
+
+def upsert(rng, dataset, options):
+    # a like/rate PATCH of UserBookRelationView
+    upsert_relation(User(pk=rng.choice(dataset['users'])), rng.choice(dataset['books']),
+                    {'like': rng.random() < 0.5, 'rate': rng.randint(1, 5)})
+
+
+OPERATIONS = {
+    'set_rating': rate_book,
+    'my_relation': list_my_relation,
+    'get_or_create': get_or_create_relation,
+    'upsert': upsert,
+}
+
+
+class Command(BaseCommand):
+    help = ('Seed a large relation table (50M relations by default), time the hot UserBookRelation statements '
+            'and report how many hash partitions each of them reads, see store.partitioning')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500000)
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--relations', type=int, default=100, help='Relations per user')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed gives the same dataset and calls')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel seeding processes')
+        parser.add_argument('--reuse', action='store_true', help='Run on an already seeded dataset')
+        parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS), default=list(OPERATIONS))
+        parser.add_argument('--calls', type=int, default=1000, help='Calls per operation')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded dataset after the run')
+        parser.add_argument('--output', help='Write the JSON report to a file instead of stdout')
+        parser.add_argument('--database', help='Name of the default database, confirming that it is a throwaway one. '
+                                               'Required unless it is the database of a test run')
+
+    def handle(self, *args, **options):
+        check_scratch_database(options['database'])
+        start = perf_counter()
+        if options['reuse']:
+            dataset = {
+                'users': list(User.objects.filter(username__startswith=PREFIX).values_list('pk', flat=True)),
+                'books': list(Book.objects.filter(name__startswith=PREFIX).values_list('pk', flat=True)),
+            }
+        else:
+            delete_seeded()
+            dataset = seed(users=options['users'], books=options['books'], relations=options['relations'],
+                           seed=options['seed'], workers=max(options['workers'], 1),
+                           log=lambda message: self.stderr.write(f'{perf_counter() - start:8.1f}s  {message}'))
+        seeded = perf_counter() - start
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {UserBookRelation._meta.db_table}')
+
+        try:
+            results = [self.run_operation(name, dataset, options) for name in options['operations']]
+            relations = UserBookRelation.objects.count()
+        finally:
+            if not options['keep']:
+                delete_seeded()
+
+        report = json.dumps({
+            'database': connection.vendor,
+            'dataset': {name: options[name] for name in ('users', 'books', 'relations', 'seed')},
+            'relation_rows': relations,
+            'partitions': len(relation_partitions()),
+            'seed_seconds': round(seeded, 3),
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def run_operation(self, name, dataset, options):
+        rng = random.Random(f'{options["seed"]}:{name}')
+        # the statements of one call, explained afterwards for the partitions they read
+        with CaptureQueriesContext(connection) as queries:
+            OPERATIONS[name](rng, dataset, options)
+        table = UserBookRelation._meta.db_table
+        scanned = [len(scanned_partitions(query['sql'])) for query in queries.captured_queries
+                   if table in query['sql'] and not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+        latencies = []
+        for _ in range(options['calls']):
+            start = perf_counter()
+            OPERATIONS[name](rng, dataset, options)
+            latencies.append(perf_counter() - start)
+        latencies.sort()
+        return {
+            'operation': name,
+            'calls': len(latencies),
+            **{f'p{percent}_ms': round(percentile(latencies, percent) * 1000, 3) for percent in (50, 95, 99)},
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            # per statement touching the relations, 1 of `partitions` when pruned, 0 for an INSERT routed to its own
+            'partitions_scanned': scanned,
+        }
@@ -0,0 +1,215 @@
+import http.client
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from time import perf_counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from store.management.commands.bench_api import percentile
+from store.seeding import check_scratch_database, delete_seeded, seed
+
+# how each deployment is started, `{port}`, `{workers}` and `{threads}` are filled in from the options
+SERVERS = {
+    'wsgi': ['-m', 'gunicorn', 'testdrf.wsgi:application', '--bind', '127.0.0.1:{port}', '--workers', '{workers}',
+             '--threads', '{threads}', '--log-level', 'warning'],
+    'asgi': ['-m', 'uvicorn', 'testdrf.asgi:application', '--port', '{port}', '--workers', '{workers}',
+             '--no-access-log', '--log-level', 'warning'],
+}
+
+# the synchronous DRF routes and their store.async_views variants
+ROUTES = {
+    'sync': {'list': 'book-list', 'detail': 'book-detail', 'relation': 'userbookrelation-detail'},
+    'async': {'list': 'async-book-list', 'detail': 'async-book-detail', 'relation': 'async-userbookrelation-detail'},
+}
+
+
+def get_list(rng, routes, dataset):
+    return 'GET', f'{reverse(routes["list"])}?{urlencode({"page_size": dataset["page_size"]})}', None
+
+
+def get_detail(rng, routes, dataset):
+    return 'GET', reverse(routes['detail'], args=(rng.choice(dataset['books']),)), None
+
+
+def patch_relation(rng, routes, dataset):
+    data = {'like': rng.random() < 0.5, 'rate': rng.randint(1, 5)}
+    return 'PATCH', reverse(routes['relation'], args=(rng.choice(dataset['books']),)), json.dumps(data)
+
+
+SCENARIOS = {
+    'list': get_list,
+    'detail': get_detail,
+    'relation': patch_relation,
+}
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset, serve the project with gunicorn (WSGI) and uvicorn (ASGI) and compare '
+            'the throughput of the synchronous and async book routes over HTTP at several concurrency levels')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--relations', type=int, default=10, help='Relations per user')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed gives the same dataset and requests')
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument('--views', nargs='+', choices=list(ROUTES), default=list(ROUTES))
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--workers', type=int, default=1, help='Server processes')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per run')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests before every run')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded dataset after the run')
+        parser.add_argument('--output', help='Write the JSON report to a file instead of stdout')
+        parser.add_argument('--database', help='Name of the default database, confirming that it is a throwaway one. '
+                                               'Required unless it is the database of a test run')
+
+    def handle(self, *args, **options):
+        check_scratch_database(options['database'])
+        # the servers are separate processes, so the dataset is committed to the configured database
+        delete_seeded()
+        dataset = seed(users=options['users'], books=options['books'], relations=options['relations'],
+                       seed=options['seed'])
+        dataset['page_size'] = options['page_size']
+        results, clients = [], []
+        try:
+            sessions = self.login(dataset['users'][:max(options['concurrency'])], clients)
+            for server in options['servers']:
+                with self.serve(server, options):
+                    results += [self.run_level(server, view, name, level, dataset, sessions, options)
+                                for view in options['views'] for name in options['scenarios']
+                                for level in options['concurrency']]
+        finally:
+            for client in clients:
+                client.logout()
+            if not options['keep']:
+                delete_seeded()
+
+        report = json.dumps({
+            'database': connection.vendor,
+            'dataset': {name: options[name] for name in ('users', 'books', 'relations', 'seed', 'page_size')},
+            'servers': {name: options[name] for name in ('workers', 'threads')},
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def login(self, user_ids, clients):
+        # a stored session and a CSRF token per client, relation PATCHes go through session auth on both routes
+        sessions = []
+        for user_id in user_ids:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            clients.append(client)
+            token = get_random_string(32)
+            sessions.append({
+                'Cookie': f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+                          f'{settings.CSRF_COOKIE_NAME}={token}',
+                'X-CSRFToken': token,
+            })
+        return sessions
+
+    def serve(self, server, options):
+        command = [sys.executable, *(part.format(**options) for part in SERVERS[server])]
+        try:
+            process = subprocess.Popen(command)
+        except OSError as exc:
+            raise CommandError(f'Could not start {server}: {exc}')
+        return Server(process, options['port'])
+
+    def run_level(self, server, view, name, level, dataset, sessions, options):
+        self.run_worker(ROUTES[view], name, dataset, sessions[0], count(), options['warmup'], options)
+        counter = count()
+        start = perf_counter()
+        with ThreadPoolExecutor(level) as pool:
+            workers = list(pool.map(
+                lambda i: self.run_worker(ROUTES[view], name, dataset, sessions[i % len(sessions)], counter,
+                                          options['requests'], options, options['seed'] + i),
+                range(level)))
+        elapsed = perf_counter() - start
+
+        latencies = sorted(latency for worker in workers for latency in worker['latencies'])
+        return {
+            'server': server,
+            'view': view,
+            'scenario': name,
+            'concurrency': level,
+            'requests': len(latencies),
+            'errors': sum(worker['errors'] for worker in workers),
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+            **{f'p{percent}_ms': round(percentile(latencies, percent) * 1000, 2) if latencies else None
+               for percent in (50, 95, 99)},
+        }
+
+    def run_worker(self, routes, name, dataset, session, counter, requests, options, worker_seed=None):
+        # one keep-alive connection per worker, http.client reconnects when the server closes it
+        rng = random.Random(options['seed'] if worker_seed is None else worker_seed)
+        conn = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=60)
+        headers = {**session, 'Content-Type': 'application/json'}
+        latencies, errors = [], 0
+        try:
+            while next(counter) < requests:
+                method, url, body = SCENARIOS[name](rng, routes, dataset)
+                start = perf_counter()
+                try:
+                    conn.request(method, url, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    errors += response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    errors += 1
+                latencies.append(perf_counter() - start)
+        finally:
+            conn.close()
+        return {'latencies': latencies, 'errors': errors}
+
+
+class Server:
+    # a started server process, ready once its port accepts connections and stopped on exit
+    startup_timeout = 30
+
+    def __init__(self, process, port):
+        self.process = process
+        self.port = port
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise CommandError(f'Server exited with code {self.process.returncode}: {self.process.args}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.__exit__()
+                    raise CommandError(f'Server did not start listening on port {self.port}')
+                time.sleep(0.1)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
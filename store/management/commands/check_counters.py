@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from store.cache import invalidate_books
+from store.logic import inconsistent_books, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Compare denormalized like/rating counters of books with user relations and optionally repair them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Rebuild counters of inconsistent books')
+
+    def handle(self, *args, **options):
+        # read from the primary: a lagging replica would report, and --repair rebuild, books that are consistent
+        book_ids = list(inconsistent_books().values_list('pk', flat=True))
+        if not book_ids:
+            self.stdout.write(self.style.SUCCESS('All book counters are consistent'))
+            return
+
+        shown = ', '.join(str(book_id) for book_id in book_ids[:20])
+        self.stdout.write(self.style.WARNING(f'{len(book_ids)} books with inconsistent counters: {shown}'))
+        if options['repair']:
+            repaired = rebuild_counters(book_ids=book_ids)
+            invalidate_books(book_ids)
+            self.stdout.write(self.style.SUCCESS(f'Repaired counters for {repaired} books'))
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.logic import flush_dirty_ratings, rating_queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute ratings of books marked dirty in deferred mode, once per book per flush interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.RATING_FLUSH_INTERVAL,
+                            help='Seconds to wait between flushes')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Max books recomputed per flush')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = rating_queue_stats()
+            flushed = 0
+            while True:
+                batch = flush_dirty_ratings(options['batch_size'])
+                flushed += batch
+                if batch < options['batch_size']:
+                    break
+            if flushed or options['verbosity'] > 1:
+                self.stdout.write(f'Recomputed {flushed} books, queue depth {stats["depth"]}, lag {stats["lag"]:.2f}s')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.cache import invalidate_all
+from store.listing import listing_stats, refresh_listings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the BookListing read model of all books from scratch'
+
+    def handle(self, *args, **options):
+        if settings.BOOK_LISTING:
+            # store.signals rebuilds it right away (there's no transaction to wait for), then cached responses
+            # read from the old rows are invalidated
+            invalidate_all()
+        else:
+            refresh_listings()
+        stats = listing_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt listings for {stats["rows"]} books, {stats["stale"]} stale'))
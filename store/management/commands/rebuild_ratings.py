@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.cache import invalidate_all
+from store.logic import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized rating counters of all books from user relations'
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings()
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating counters for {updated} books'))
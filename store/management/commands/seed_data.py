@@ -0,0 +1,49 @@
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from store.seeding import PREFIX, check_scratch_database, delete_seeded, seed
+
+
+class Command(BaseCommand):
+    help = ('Generate a large synthetic dataset of users, books and user relations with bulk inserts '
+            '(COPY on PostgreSQL), deterministic for a seed and optionally in parallel worker processes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--relations', type=int, default=10, help='Relations per user')
+        parser.add_argument('--like-ratio', type=float, default=0.3)
+        parser.add_argument('--rate-ratio', type=float, default=0.5)
+        parser.add_argument('--seed', type=int, default=0, help='The same seed gives the same dataset')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT or COPY')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Users or books handled by one worker task in one transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes')
+        parser.add_argument('--flush', action='store_true', help='Drop a previously seeded dataset first')
+        parser.add_argument('--delete', action='store_true', help='Only drop the seeded dataset')
+        parser.add_argument('--database', help='Name of the default database, confirming that it is a throwaway one. '
+                                               'Required unless it is the database of a test run')
+
+    def handle(self, *args, **options):
+        # seeded rows are inserted and deleted without signals, see store.seeding
+        check_scratch_database(options['database'])
+        if options['delete'] or options['flush']:
+            deleted = delete_seeded()
+            self.stdout.write(f'Deleted {deleted} seeded rows')
+            if options['delete']:
+                return
+        elif User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError('A seeded dataset already exists, use --flush to replace it')
+
+        start = perf_counter()
+        dataset = seed(
+            users=options['users'], books=options['books'], relations=options['relations'],
+            like_ratio=options['like_ratio'], rate_ratio=options['rate_ratio'], seed=options['seed'],
+            batch_size=options['batch_size'], chunk_size=options['chunk_size'], workers=max(options['workers'], 1),
+            log=lambda message: self.stdout.write(f'{perf_counter() - start:8.1f}s  {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(dataset["users"])} users and {len(dataset["books"])} books in {perf_counter() - start:.1f}s'
+        ))
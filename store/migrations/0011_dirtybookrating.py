@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-16 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_book_rating_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyBookRating',
+            fields=[
+                ('book_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
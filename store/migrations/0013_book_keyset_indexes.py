@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-16 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_book_likes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['price', 'id'], name='store_book_price_613d0a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author_name', 'id'], name='store_book_author__92c184_idx'),
+        ),
+    ]
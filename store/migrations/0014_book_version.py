@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_book_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-16 20:45
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# GIN index and trigger only exist on PostgreSQL, other databases search with store.search.InvertedIndex
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX store_book_search_vector_idx ON store_book USING gin (search_vector)')
+    schema_editor.execute(
+        'CREATE TRIGGER store_book_search_vector_update '
+        'BEFORE INSERT OR UPDATE OF name, author_name ON store_book FOR EACH ROW '
+        "EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.simple', name, author_name)"
+    )
+    schema_editor.execute(
+        "UPDATE store_book SET search_vector = to_tsvector('pg_catalog.simple', name || ' ' || author_name)"
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS store_book_search_vector_update ON store_book')
+    schema_editor.execute('DROP INDEX IF EXISTS store_book_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_book_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
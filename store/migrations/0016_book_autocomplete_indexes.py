@@ -0,0 +1,46 @@
+# Generated by Django 5.0.2 on 2026-10-16 21:30
+
+from django.db import migrations
+
+AUTOCOMPLETE_COLUMNS = ('name', 'author_name')
+
+
+# The indexes match the UPPER(col::text) LIKE expressions of istartswith/icontains: trigram GIN for
+# word prefixes inside a label, pattern b-tree for short prefixes. Other databases use store.search.PrefixIndex.
+def create_autocomplete_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        trigram = cursor.fetchone() is not None
+    # without the contrib package the lookups still work, only infix word prefixes fall back to a scan
+    if trigram:
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in AUTOCOMPLETE_COLUMNS:
+        if trigram:
+            schema_editor.execute(
+                f'CREATE INDEX store_book_{column}_trgm_idx ON store_book '
+                f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+        schema_editor.execute(
+            f'CREATE INDEX store_book_{column}_prefix_idx ON store_book (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_autocomplete_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in AUTOCOMPLETE_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS store_book_{column}_trgm_idx')
+        schema_editor.execute(f'DROP INDEX IF EXISTS store_book_{column}_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_autocomplete_indexes, drop_autocomplete_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.2 on 2026-10-16 21:50
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def remove_duplicate_relations(apps, schema_editor):
+    # get_or_create races could store a reader twice, the oldest relation wins
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    duplicates = (UserBookRelation.objects.values('user', 'book').annotate(first=Min('pk'), total=Count('pk'))
+                  .filter(total__gt=1))
+    book_ids = set()
+    for duplicate in duplicates:
+        UserBookRelation.objects.filter(user=duplicate['user'], book=duplicate['book']).exclude(
+            pk=duplicate['first']).delete()
+        book_ids.add(duplicate['book'])
+    if not book_ids:
+        return
+
+    relations = UserBookRelation.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    rates = relations.filter(rate__isnull=False)
+    Book.objects.filter(pk__in=book_ids).update(
+        likes_count=Coalesce(Subquery(relations.annotate(total=Count('pk', filter=Q(like=True))).values('total')), 0),
+        rating_sum=Coalesce(Subquery(rates.annotate(total=Sum('rate')).values('total')), 0),
+        rating_count=Coalesce(Subquery(rates.annotate(total=Count('rate')).values('total')), 0),
+    )
+    Book.objects.filter(pk__in=book_ids).update(
+        rating=Cast('rating_sum', FloatField()) / NullIf('rating_count', 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_book_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_relations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userbookrelation',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='store_unique_user_book'),
+        ),
+    ]
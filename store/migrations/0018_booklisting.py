@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_userbookrelation_unique_user_book'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookListing',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('price_w_discount', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('author_name', models.CharField(max_length=255)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('rating', models.DecimalField(decimal_places=2, default=None, max_digits=3, null=True)),
+                ('owner_id', models.BigIntegerField(db_index=True, null=True)),
+                ('owner_name', models.CharField(max_length=150, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('modified_at', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['price', 'id'], name='store_bookl_price_4ef334_idx'),
+                            models.Index(fields=['author_name', 'id'], name='store_bookl_author__ab8fa9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:40
+
+from django.conf import settings
+from django.db import migrations
+
+TABLE = 'store_userbookrelation'
+# fixed once the rows are spread, changing it means another migration moving them again
+PARTITIONS = 16
+
+
+def move_relations(apps, schema_editor, partitions=None):
+    # Moves the relations into a new table, hash partitioned by book_id into `partitions` tables or a plain one.
+    # Keys and indexes are built once the rows are in. Django finds them by introspection, only the unique
+    # constraint is referred to by its name.
+    execute = schema_editor.execute
+    old = f'{TABLE}_old'
+    execute(f'ALTER TABLE {TABLE} RENAME TO {old}')
+    partition_by = ' PARTITION BY HASH (book_id)' if partitions else ''
+    execute(f'CREATE TABLE {TABLE} (LIKE {old} INCLUDING CONSTRAINTS){partition_by}')
+    for remainder in range(partitions or 0):
+        execute(f'CREATE TABLE {TABLE}_p{remainder} PARTITION OF {TABLE} '
+                f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})')
+    execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+    execute(f'DROP TABLE {old}')
+
+    if partitions:
+        # the key of a partitioned table has to contain the partition key, ids stay unique by the sequence
+        execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, book_id)')
+        execute(f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+        execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+    else:
+        execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id)')
+        execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 0) + 1, false) FROM {TABLE}")
+
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT store_unique_user_book UNIQUE (user_id, book_id)')
+    targets = {'book_id': apps.get_model('store', 'Book')._meta.db_table,
+               'user_id': apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table}
+    for column, target in targets.items():
+        execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{column}_fk FOREIGN KEY ({column}) '
+                f'REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED')
+        execute(f'CREATE INDEX {TABLE}_{column}_idx ON {TABLE} ({column})')
+
+
+# Declarative partitioning only exists on PostgreSQL, other databases keep the single table
+def partition_relations(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    move_relations(apps, schema_editor, PARTITIONS)
+
+
+def merge_relations(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    move_relations(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_booklisting'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_relations, merge_relations),
+    ]
@@ -1,5 +1,42 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.utils import timezone
+
+from store.cache import invalidate_books, invalidate_search
+
+
+class BookQuerySet(models.QuerySet):
+    # bulk paths skip save() and signals, so versions and cached responses are handled here
+    SEARCH_FIELDS = {'name', 'author_name'}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        invalidate_books([obj.pk for obj in objs if obj.pk is not None])
+        invalidate_search()
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            # the same for every row, one plain UPDATE is far cheaper than another CASE per book
+            self.filter(pk__in=[obj.pk for obj in objs]).update(version=models.F('version') + 1,
+                                                                modified_at=timezone.now())
+        invalidate_books([obj.pk for obj in objs])
+        if self.SEARCH_FIELDS.intersection(fields):
+            invalidate_search()
+        return rows
+
+    def delete(self):
+        # per-book and per-relation receivers skip deletes of a queryset (see store.signals), all its books
+        # are invalidated here at once
+        with transaction.atomic(using=self.db):
+            book_ids = list(self.values_list('pk', flat=True))
+            deleted = super().delete()
+            invalidate_books(book_ids)
+            invalidate_search()
+        return deleted
 
 
 # Create your models here.
@@ -12,10 +49,84 @@ class Book(models.Model):
     readers = models.ManyToManyField(User, through='UserBookRelation', related_name='books')
 
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=None, null=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+
+    # bumped on every change of the serialized book, including likes, rates and readers
+    version = models.PositiveIntegerField(default=0)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    # filled from name and author_name by a database trigger on PostgreSQL, see migration 0015
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        # keyset pagination seeks on (ordering field, id)
+        indexes = [
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['author_name', 'id']),
+        ]
+
+    # maintained by store.logic with F() updates or by the database, a stale instance must not overwrite them
+    COUNTER_FIELDS = ('rating', 'rating_sum', 'rating_count', 'likes_count', 'search_vector')
 
     def __str__(self):
         return f'Id {self.id}: {self.name}, Owner: {self.owner}'
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        kwargs['update_fields'] = {*update_fields, 'version', 'modified_at'}
+        self.version = models.F('version') + 1
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+
+class UserBookRelationQuerySet(models.QuerySet):
+    # bulk paths skip save() and signals, so counters of the touched books are rebuilt in one statement.
+    # in_bookmarks has no counter, but is serialized as my_bookmark and has to bump the book version.
+    COUNTER_FIELDS = {'like', 'rate', 'in_bookmarks', 'book', 'book_id'}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self._rebuild_counters({obj.book_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            if self.COUNTER_FIELDS.intersection(fields):
+                self._rebuild_counters({obj.book_id for obj in objs} | {obj.old_book_id for obj in objs})
+        return rows
+
+    def update(self, **kwargs):
+        if not self.COUNTER_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            book_ids = set(self.values_list('book_id', flat=True))
+            rows = super().update(**kwargs)
+            book = kwargs.get('book', kwargs.get('book_id'))
+            if book is not None:
+                book_ids.add(getattr(book, 'pk', book))
+            self._rebuild_counters(book_ids)
+        return rows
+
+    def _rebuild_counters(self, book_ids):
+        from store.logic import rebuild_counters
+
+        if book_ids:
+            rebuild_counters(Book.objects.using(self.db), book_ids=book_ids)
+            invalidate_books(book_ids)
+
 
 class UserBookRelation(models.Model):
     RATE_CHOICES = (
@@ -33,6 +144,12 @@ class UserBookRelation(models.Model):
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
     comments = models.CharField(max_length=255, blank=True)
 
+    objects = UserBookRelationQuerySet.as_manager()
+
+    class Meta:
+        # one relation per reader and book, also the conflict target of the bulk upsert
+        constraints = [models.UniqueConstraint(fields=['user', 'book'], name='store_unique_user_book')]
+
     def __str__(self):
         return f'{self.user.username}: {self.book.name}, RATE: {self.rate}, book-id: {self.book.id}'
 
@@ -40,13 +157,74 @@ class UserBookRelation(models.Model):
         super(UserBookRelation, self).__init__(*args, **kwargs)
 
         self.old_rate = self.rate
+        self.old_like = self.like
+        self.old_in_bookmarks = self.in_bookmarks
+        self.old_book_id = self.book_id
 
     def save(self, *args, **kwargs):
-        creating = not self.pk
+        adding = self._state.adding
+        old_rate = None if adding else self.old_rate
+        old_like = False if adding else self.old_like
+        # serialized as the user's my_bookmark, so the book version has to change too
+        bookmarked = not adding and self.old_in_bookmarks != self.in_bookmarks
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            from store.logic import update_counters
+
+            moved = not adding and self.old_book_id != self.book_id
+            if moved:
+                update_counters(self.old_book_id, old_like=old_like, old_rate=old_rate, touch=True)
+                old_like, old_rate = False, None
+            # a new relation adds a reader, so the book changes even without like or rate
+            update_counters(self.book_id, old_like, self.like, old_rate, self.rate,
+                            touch=adding or moved or bookmarked)
+
+        self.old_rate = self.rate
+        self.old_like = self.like
+        self.old_in_bookmarks = self.in_bookmarks
+        self.old_book_id = self.book_id
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # the stored book_id is the partition key on PostgreSQL (migration 0019), an UPDATE by pk alone
+        # would probe the primary key index of every partition
+        if not self._state.adding and self.old_book_id is not None:
+            base_qs = base_qs.filter(book_id=self.old_book_id)
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
 
-        super().save(*args, **kwargs)
 
-        if self.old_rate != self.rate or creating:
-            from store.logic import set_rating
+class DirtyBookRating(models.Model):
+    # one row per book waiting for a deferred rating recompute, repeated marks are coalesced
+    book_id = models.BigIntegerField(primary_key=True)
+    marked_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
-            set_rating(self.book)
\ No newline at end of file
+    def __str__(self):
+        return f'book-id: {self.book_id}, marked at: {self.marked_at}'
+
+
+class BookListing(models.Model):
+    # The list/retrieve row of a book with owner_name, likes and price_w_discount already computed, refreshed by
+    # store.listing after every change of the book. `id` is the book's, `version` the book version it was read at.
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=7, decimal_places=2)
+    price_w_discount = models.DecimalField(max_digits=7, decimal_places=2)
+    author_name = models.CharField(max_length=255)
+    likes_count = models.PositiveIntegerField(default=0)
+    rating = models.DecimalField(max_digits=3, decimal_places=2, default=None, null=True)
+    owner_id = models.BigIntegerField(null=True, db_index=True)
+    owner_name = models.CharField(max_length=150, null=True)
+    version = models.PositiveIntegerField(default=0)
+    modified_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        # the keyset pagination indexes of Book
+        indexes = [
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['author_name', 'id']),
+        ]
+
+    def __str__(self):
+        return f'book-id: {self.id}, version: {self.version}, refreshed at: {self.refreshed_at}'
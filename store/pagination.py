@@ -0,0 +1,159 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import BooleanField, F, Func, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RowComparison(Func):
+    # `(a, b) > (x, y)` of fields and values, a single range bound an index on (a, b) can seek to. Values are
+    # prepared for their fields like the values of a lookup.
+    output_field = BooleanField()
+
+    def __init__(self, fields, values, operator):
+        super().__init__(*(F(field) for field in fields))
+        self.values = values
+        self.operator = operator
+
+    def as_sql(self, compiler, connection):
+        columns, params = [], []
+        for expression in self.get_source_expressions():
+            sql, column_params = compiler.compile(expression)
+            columns.append(sql)
+            params.extend(column_params)
+        for expression, value in zip(self.get_source_expressions(), self.values):
+            field = expression.output_field
+            params.append(field.get_db_prep_value(field.to_python(value), connection))
+        placeholders = ', '.join(['%s'] * len(self.values))
+        return f'({", ".join(columns)}) {self.operator} ({placeholders})', params
+
+
+# Forward-only keyset pagination. The cursor keeps the ordering values of the last row,
+# so a deep page is a `WHERE (price, id) > (...)` range scan instead of an OFFSET.
+class KeysetPagination(BasePagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # readers prefetch runs on evaluation, so it only covers rows of this page
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # paginate_queryset for async views, the page is read with the async ORM
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        # the rows of the page plus one, which tells whether there is a next page
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+
+        values = self.decode_cursor(request, self.ordering, queryset)
+        if values is not None:
+            queryset = queryset.filter(self.get_cursor_filter(self.ordering, values))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_page(self, results):
+        page = results[:self.page_size]
+        self.next_values = None
+        if len(results) > self.page_size:
+            self.next_values = [self.get_value(page[-1], field.lstrip('-')) for field in self.ordering]
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, queryset):
+        # ordering comes from OrderingFilter, the tie-breaker makes it total so equal prices don't skip rows
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or [self.tie_breaker]
+        if not any(field.lstrip('-') in (self.tie_breaker, 'pk') for field in ordering):
+            direction = '-' if ordering[0].startswith('-') else ''
+            ordering.append(f'{direction}{self.tie_breaker}')
+        return ordering
+
+    def get_cursor_filter(self, ordering, values):
+        names = [field.lstrip('-') for field in ordering]
+        descending = [field.startswith('-') for field in ordering]
+        if len(set(descending)) == 1:
+            return RowComparison(names, values, '<' if descending[0] else '>')
+
+        # mixed directions have no row form: a > x OR (a = x AND b < y), led by a >= x for the index seek
+        cursor_filter = Q()
+        equal = Q()
+        for name, desc, value in zip(names, descending, values):
+            lookup = 'lt' if desc else 'gt'
+            cursor_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return Q(**{f'{names[0]}__{"lte" if descending[0] else "gte"}': values[0]}) & cursor_filter
+
+    def get_value(self, obj, field):
+        value = obj[field] if isinstance(obj, dict) else getattr(obj, field)
+        return str(value) if isinstance(value, Decimal) else value
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        payload = json.dumps({'o': self.ordering, 'v': self.next_values}, separators=(',', ':'))
+        cursor = urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, ordering, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = payload['v']
+            valid = payload['o'] == ordering and len(values) == len(ordering)
+            if valid:
+                # typed like the ordering fields, so a tampered value can't reach the query
+                values = [self.get_field(queryset, field.lstrip('-')).to_python(value)
+                          for field, value in zip(ordering, values)]
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            valid = False
+        if not valid:
+            # cursor from a different ordering or a tampered one
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_field(self, queryset, name):
+        # model field or annotation (e.g. the search rank) the page is ordered by
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
@@ -0,0 +1,37 @@
+import json
+
+from django.db import connection, transaction
+
+from .models import UserBookRelation
+
+
+def relation_partitions():
+    # tables of the hash partitions of UserBookRelation (migration 0019), none where it's a single table
+    if connection.vendor != 'postgresql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'WHERE i.inhparent = %s::regclass ORDER BY c.relname', [UserBookRelation._meta.db_table])
+        return [name for name, in cursor.fetchall()]
+
+
+def scanned_partitions(sql, params=None):
+    # Partitions a statement really reads, from EXPLAIN ANALYZE in a rolled back transaction. Partitions pruned
+    # by the planner aren't in the plan at all, ones pruned at run time are in it but never executed.
+    partitions = set(relation_partitions())
+    if not partitions:
+        return set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        transaction.set_rollback(True)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scanned, nodes = set(), [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node.get('Relation Name') in partitions and node.get('Actual Loops'):
+            scanned.add(node['Relation Name'])
+        nodes += node.get('Plans', [])
+    return scanned
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+COUNTERS = ('requests', 'waits', 'timeouts', 'opened', 'closed', 'health_check_failures')
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    # Thread-safe pool of DB-API connections. Returned connections are handed out again last in first out,
+    # so a few stay warm and the rest age out after `max_idle` seconds (down to `min_size`). A connection older
+    # than `max_lifetime` is replaced, one idle for `check_after` seconds is probed with `check` first.
+    # `reset` brings a returned connection back to a clean state and returns False when it's broken.
+    def __init__(self, max_size=10, min_size=0, timeout=10.0, max_lifetime=None, max_idle=None, check_after=None,
+                 check=None, reset=None):
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.check = check or (lambda connection: True)
+        self.reset = reset or (lambda connection: True)
+
+        self._lock = threading.Condition()
+        # (connection, created at, returned at), the most recently returned on the right
+        self._idle = deque()
+        # id(connection) -> created at, of the checked out connections
+        self._in_use = {}
+        # idle, checked out and being opened
+        self._size = 0
+        self._waiting = 0
+        self._wait_seconds = 0.0
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._closed = False
+
+    def getconn(self, connect):
+        # `connect()` opens a new connection when no idle one is left and the pool isn't full
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self._counters['requests'] += 1
+        while True:
+            connection, created, stale = self._reserve(deadline)
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._release(closed=False)
+                    raise
+                created = time.monotonic()
+                with self._lock:
+                    self._counters['opened'] += 1
+            elif stale and not self._is_healthy(connection):
+                with self._lock:
+                    self._counters['health_check_failures'] += 1
+                self._discard(connection)
+                continue
+            with self._lock:
+                self._in_use[id(connection)] = created
+            return connection
+
+    def putconn(self, connection, close=False):
+        with self._lock:
+            created = self._in_use.pop(id(connection), None)
+        if created is None:
+            # not from this pool, e.g. from one replaced after a settings change
+            self._close(connection)
+            return
+        if not close:
+            try:
+                close = not self.reset(connection)
+            except Exception:
+                close = True
+        now = time.monotonic()
+        if close or self._closed or (self.max_lifetime is not None and now - created >= self.max_lifetime):
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append((connection, created, now))
+            self._lock.notify()
+
+    def close(self):
+        # idle connections are closed now, checked out ones when they come back
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'min_size': self.min_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'utilization': (self._size - idle) / self.max_size,
+                'waiting': self._waiting,
+                'wait_seconds': self._wait_seconds,
+                **self._counters,
+            }
+
+    def _reserve(self, deadline):
+        # (idle connection, created at, whether to check it) or (None, None, False) for a slot to open one in
+        expired = []
+        try:
+            with self._lock:
+                waited = False
+                while True:
+                    now = time.monotonic()
+                    expired += self._expire(now)
+                    if self._idle:
+                        connection, created, returned = self._idle.pop()
+                        stale = self.check_after is not None and now - returned >= self.check_after
+                        return connection, created, stale
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, None, False
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(f'No connection available in {self.timeout}s, '
+                                          f'all {self.max_size} are in use.')
+                    if not waited:
+                        waited = True
+                        self._counters['waits'] += 1
+                    self._waiting += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                        self._wait_seconds += time.monotonic() - now
+        finally:
+            for connection in expired:
+                self._discard(connection)
+
+    def _expire(self, now):
+        # idle connections past max_lifetime, and the least recently used ones past max_idle above min_size.
+        # Their slots stay taken until _discard() closes them outside of the lock.
+        expired = []
+        for item in list(self._idle):
+            connection, created, returned = item
+            too_old = self.max_lifetime is not None and now - created >= self.max_lifetime
+            too_idle = (self.max_idle is not None and now - returned >= self.max_idle and
+                        self._size - len(expired) > self.min_size)
+            if too_old or too_idle:
+                self._idle.remove(item)
+                expired.append(connection)
+        return expired
+
+    def _is_healthy(self, connection):
+        try:
+            return self.check(connection)
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        self._close(connection)
+        self._release()
+
+    def _release(self, closed=True):
+        with self._lock:
+            self._size -= 1
+            self._counters['closed'] += closed
+            self._lock.notify()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+# alias -> (pid, key, pool), the pools of a forked process are never shared with its parent
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, key, options, **callbacks):
+    # the pool of a database alias, `key` identifies the connection parameters and a new key replaces the pool
+    with _pools_lock:
+        entry = _pools.get(alias)
+        if entry is None or entry[:2] != (os.getpid(), key):
+            if entry is not None and entry[0] == os.getpid():
+                entry[2].close()
+            entry = _pools[alias] = (os.getpid(), key, ConnectionPool(**options, **callbacks))
+        return entry[2]
+
+
+def close_pool(alias):
+    with _pools_lock:
+        entry = _pools.pop(alias, None)
+    if entry is not None and entry[0] == os.getpid():
+        entry[2].close()
+
+
+def pool_stats():
+    # {alias: stats} of the pools of this process
+    with _pools_lock:
+        pools = {alias: pool for alias, (pid, _, pool) in _pools.items() if pid == os.getpid()}
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -0,0 +1,46 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes U+2028/U+2029 raw, JSONRenderer escapes them for embedding the JSON into <script>
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class ORJSONRenderer(JSONRenderer):
+    # The bytes of JSONRenderer, produced by orjson when it's installed. Decimals, datetimes, lazy strings
+    # and querysets go through DRF's encoder like before, so `price` or `rating` keep their formatting.
+    # Indented (browsable, `; indent=`) or non-compact/ASCII output is left to JSONRenderer.
+    # Floats print as the shortest round-trip form like json does, except exponents: `1e16`, not `1e+16`.
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii or
+                self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        if b'\xe2\x80' in ret:
+            for raw, escaped in LINE_SEPARATORS:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    # JSONParser with orjson.loads when it's installed, numbers come back as int/float like before
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,138 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import empty
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'store:replicas:pin:{}'
+
+# the replica alias reads of the current request or block go to, None sends them to the primary
+_replica = ContextVar('store_replica', default=None)
+
+
+def choose_replica():
+    # one replica per request, so all queries of a page see the same snapshot
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def replica_reads(alias=None):
+    # reads of the block go to `alias`, a random replica by default
+    token = _replica.set(alias or choose_replica())
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def current_replica():
+    return _replica.get()
+
+
+def pin_to_primary(user):
+    # read-your-writes: a user who just changed something reads from the primary while replicas catch up
+    cache.set(PIN_KEY.format(user.pk), True, settings.REPLICA_LAG_SECONDS)
+
+
+async def apin_to_primary(user):
+    await cache.aset(PIN_KEY.format(user.pk), True, settings.REPLICA_LAG_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(PIN_KEY.format(user.pk), False)
+
+
+async def ais_pinned(user):
+    return user.is_authenticated and await cache.aget(PIN_KEY.format(user.pk), False)
+
+
+class ReplicaRouter:
+    # Writes always go to the primary. Reads go to a replica only inside replica_reads() or a request of
+    # ReplicaReadMixin, and never in a transaction of the primary, which has to see its own writes.
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # also for instances read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary, which is never vetoed even when it stands in for a
+        # replica (TransactionTestCase flushes only the tables it may migrate)
+        if db != DEFAULT_DB_ALIAS and db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    # pins the user to the primary after every successful unsafe request, whichever view handled it
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.should_pin(request, response):
+            pin_to_primary(request.user)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.should_pin(request, response):
+            await apin_to_primary(request.user)
+        return response
+
+    def should_pin(self, request, response):
+        # a lazy user the view never resolved didn't write anything, and can't be loaded in an async request
+        user = getattr(request, 'user', None)
+        return (request.method not in SAFE_METHODS and response.status_code < 400 and
+                user is not None and getattr(user, '_wrapped', None) is not empty and user.is_authenticated)
+
+
+class ReplicaReadMixin:
+    # safe requests of the view read from one replica, unless the user is pinned to the primary
+    def dispatch(self, request, *args, **kwargs):
+        with primary_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned(request.user):
+            _replica.set(choose_replica())
+
+    def get_cache_timeout(self):
+        # a lagging replica could put stale data under fresh cache versions, it's kept only for the lag
+        timeout = super().get_cache_timeout()
+        if current_replica() is not None:
+            return min(timeout, settings.REPLICA_LAG_SECONDS)
+        return timeout
@@ -0,0 +1,37 @@
+from rest_framework.response import Response
+
+
+class RowQuerysetMixin:
+    # `.values()` rows of the fields `row_serializer_class` serializes
+    row_serializer_class = None
+    # read besides the serialized values, e.g. for ETags of store.conditional
+    row_extra_fields = ()
+
+    def get_row_queryset(self, queryset):
+        # keyset pagination reads the ordering values of the last row, so they are selected too
+        ordering = [field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)]
+        optional = [field for field in getattr(self.row_serializer_class, 'optional_values', ())
+                    if field in queryset.query.annotations]
+        fields = dict.fromkeys([*self.row_serializer_class.values, *optional, *self.row_extra_fields, *ordering])
+        return queryset.prefetch_related(None).values(*fields)
+
+
+class RowsReadMixin(RowQuerysetMixin):
+    # list/retrieve read `.values()` rows and serialize them with `row_serializer_class`,
+    # writes and every other action keep the model serializer
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'retrieve':
+            return self.get_row_queryset(queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_row_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.row_serializer_class(page, many=True).data)
+        return Response(self.row_serializer_class(queryset, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        # get_object() looks the row up in filter_queryset(), with the usual 404 and permission checks
+        return Response(self.row_serializer_class(self.get_object()).data)
@@ -0,0 +1,160 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, Min, Q, Value, When
+from django.db.models.functions import Cast, Lower
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from store.cache import SEARCH_VERSION_KEY, get_version
+
+TOKEN_RE = re.compile(r'\w+')
+AUTOCOMPLETE_FIELDS = ('name', 'author_name')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    # token -> {book id: occurrences}, tokens are kept sorted so a term matches every token it prefixes
+    def __init__(self, rows):
+        self.postings = defaultdict(Counter)
+        for book_id, *texts in rows:
+            for token in tokenize(' '.join(texts)):
+                self.postings[token][book_id] += 1
+        self.tokens = sorted(self.postings)
+
+    def search(self, terms):
+        # every term has to match (like the `&` tsquery), the score adds occurrences of matched tokens
+        scores = None
+        for term in terms:
+            matches = Counter()
+            position = bisect_left(self.tokens, term)
+            while position < len(self.tokens) and self.tokens[position].startswith(term):
+                matches.update(self.postings[self.tokens[position]])
+                position += 1
+            if scores is None:
+                scores = matches
+            else:
+                scores = Counter({book_id: scores[book_id] + count for book_id, count in matches.items()
+                                  if book_id in scores})
+            if not scores:
+                break
+        return dict(scores or {})
+
+
+class PrefixIndex:
+    # sorted (lowercase suffix starting at a word, field, label, book id), `bisect` finds every label
+    # having a word that starts with the typed text
+    def __init__(self, rows):
+        entries = []
+        for book_id, *labels in rows:
+            for field, label in zip(AUTOCOMPLETE_FIELDS, labels):
+                lower = label.lower()
+                for match in TOKEN_RE.finditer(lower):
+                    entries.append((lower[match.start():], match.start(), field, label, book_id))
+        entries.sort()
+        self.entries = entries
+        self.keys = [entry[0] for entry in entries]
+
+    def search(self, text, field, limit):
+        text = text.lower()
+        found = {}
+        position = bisect_left(self.keys, text)
+        while position < len(self.keys) and self.keys[position].startswith(text):
+            _, offset, entry_field, label, book_id = self.entries[position]
+            position += 1
+            if entry_field != field:
+                continue
+            # authors are listed once, with the first of their books
+            key = label if field == 'author_name' else book_id
+            if key not in found or (offset, book_id) < found[key][:2]:
+                found[key] = (offset, book_id, label)
+        # whole-label prefix matches first, then alphabetically
+        matches = sorted(found.values(), key=lambda match: (match[0] > 0, match[2].lower(), match[1]))
+        return [{'id': book_id, 'label': label} for _, book_id, label in matches[:limit]]
+
+
+class BookIndex:
+    # process-local index for databases without full-text search, rebuilt when any book changes
+    def __init__(self, index_class):
+        self.index_class = index_class
+        self.lock = threading.Lock()
+        self.version = None
+        self.index = None
+
+    def get(self, queryset):
+        version = get_version(SEARCH_VERSION_KEY)
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    rows = queryset.model.objects.values_list('pk', 'name', 'author_name').iterator()
+                    self.index = self.index_class(rows)
+                    self.version = version
+        return self.index
+
+
+book_index = BookIndex(InvertedIndex)
+prefix_index = BookIndex(PrefixIndex)
+
+
+def autocomplete(queryset, text, limit):
+    # ids and labels of books and authors having a word starting with `text`,
+    # served by pg_trgm/prefix indexes on PostgreSQL (migration 0016) and by PrefixIndex elsewhere
+    text = ' '.join(text.split())
+    if not text:
+        return {field: [] for field in AUTOCOMPLETE_FIELDS}
+    if connection.vendor != 'postgresql':
+        index = prefix_index.get(queryset)
+        return {field: index.search(text, field, limit) for field in AUTOCOMPLETE_FIELDS}
+
+    results = {}
+    for field in AUTOCOMPLETE_FIELDS:
+        matches = queryset.filter(Q(**{f'{field}__istartswith': text}) | Q(**{f'{field}__icontains': f' {text}'}))
+        whole_prefix = Case(When(**{f'{field}__istartswith': text}, then=Value(0)), default=Value(1))
+        if field == 'author_name':
+            matches = matches.values(field).annotate(book_id=Min('pk'))
+        else:
+            matches = matches.annotate(book_id=F('pk'))
+        matches = matches.annotate(whole_prefix=whole_prefix, label_lower=Lower(field))
+        rows = matches.order_by('whole_prefix', 'label_lower', 'book_id').values_list('book_id', field)[:limit]
+        results[field] = [{'id': book_id, 'label': label} for book_id, label in rows]
+    return results
+
+
+class BookSearchFilter(BaseFilterBackend):
+    # Full-text `?search=` over name and author_name ranked by relevance. Every term is a prefix,
+    # so `?search=auth` still finds `Author`. Explicit `?ordering=` (OrderingFilter) wins over the rank.
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+    config = 'simple'
+    # Without full-text search every match is a CASE branch and an id of the SQL, so only the best scored
+    # max_candidates matches (ties by id) are found at all, further ones are left out of results and pages
+    max_candidates = 1000
+
+    def filter_queryset(self, request, queryset, view):
+        terms = tokenize(request.query_params.get(self.search_param, ''))
+        if not terms:
+            return queryset
+
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config=self.config, search_type='raw')
+            # ts_rank is a float4, as double precision the value survives the JSON round trip of the cursor
+            rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+            queryset = queryset.filter(search_vector=query).annotate(search_rank=rank)
+        else:
+            scores = book_index.get(queryset).search(terms)
+            scores = dict(heapq.nsmallest(self.max_candidates, scores.items(), key=lambda item: (-item[1], item[0])))
+            rank = Case(*[When(pk=book_id, then=Value(float(score))) for book_id, score in scores.items()],
+                        default=Value(0.0), output_field=FloatField())
+            queryset = queryset.filter(pk__in=list(scores)).annotate(search_rank=rank)
+
+        if self.ordering_param not in request.query_params:
+            queryset = queryset.order_by('-search_rank', 'id')
+        return queryset
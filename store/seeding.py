@@ -0,0 +1,213 @@
+import io
+import multiprocessing
+import random
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection, connections, models, transaction
+from django.db.models import Q
+
+from store.cache import invalidate_all, invalidate_search
+from store.logic import rebuild_counters
+from store.models import Book, UserBookRelation
+
+# every seeded user and book is named with the prefix, so a dataset can be found and dropped later
+PREFIX = 'bench_'
+RATES = (1, 2, 3, 4, 5)
+RATE_WEIGHTS = (5, 10, 20, 35, 30)
+WORDS = ('python', 'django', 'rest', 'guide', 'patterns', 'data', 'web', 'design', 'fluent', 'deep', 'learning',
+         'systems', 'modern', 'practical', 'effective', 'clean', 'code', 'architecture', 'testing', 'cookbook')
+NAMES = ('Ivan', 'Petr', 'Anna', 'Maria', 'Oleg', 'Olga', 'Eric', 'Luciano', 'David', 'Brett')
+RELATION_COLUMNS = ('user_id', 'book_id', 'like', 'in_bookmarks', 'rate', 'comments')
+
+# ids loaded by the parent process before the workers are forked, every worker reads them from here
+_state = {}
+
+
+def pick_books(rng, books, cum_weights, count):
+    # `count` distinct books, popular (low index) books are picked far more often, like real readers do
+    count = min(count, len(books))
+    if count * 2 > len(books):
+        return rng.sample(books, count)
+    picked = {}
+    while len(picked) < count:
+        picked.update(dict.fromkeys(rng.choices(books, cum_weights=cum_weights, k=count - len(picked))))
+    return list(picked)
+
+
+def chunk_rng(options, phase, chunk):
+    # seeded per chunk, so the data doesn't depend on how many workers share the chunks
+    return random.Random(f'{options["seed"]}:{phase}:{chunk}')
+
+
+def chunk_range(options, total, chunk):
+    start = chunk * options['chunk_size']
+    return range(start, min(start + options['chunk_size'], total))
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def insert(model, objs, batch_size):
+    # a plain QuerySet skips the counter and cache hooks of the model's own manager
+    return models.QuerySet(model).bulk_create(objs, batch_size=batch_size)
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_relations(rows):
+    # COPY is several times faster than multi-row INSERTs and fires no per-row work besides constraints
+    quote = connection.ops.quote_name
+    sql = (f'COPY {quote(UserBookRelation._meta.db_table)} '
+           f'({", ".join(quote(column) for column in RELATION_COLUMNS)}) FROM STDIN')
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO(''.join('\t'.join(map(copy_value, row)) + '\n' for row in rows))
+            raw.copy_expert(sql, buffer)
+
+
+def insert_relations(rows, batch_size):
+    for batch in batched(rows, batch_size):
+        if connection.vendor == 'postgresql':
+            copy_relations(batch)
+        else:
+            insert(UserBookRelation, [UserBookRelation(**dict(zip(RELATION_COLUMNS, row))) for row in batch],
+                   batch_size)
+
+
+def create_users(options, chunk):
+    rng = chunk_rng(options, 'users', chunk)
+    with transaction.atomic():
+        insert(User, [User(username=f'{PREFIX}{i}', first_name=rng.choice(NAMES), last_name=f'{rng.choice(NAMES)}ov')
+                      for i in chunk_range(options, options['users'], chunk)], options['batch_size'])
+
+
+def create_books(options, chunk):
+    rng = chunk_rng(options, 'books', chunk)
+    owners = _state['owners']
+    authors = max(options['books'] // 10, 1)
+    with transaction.atomic():
+        insert(Book, [
+            Book(name=f'{PREFIX}{" ".join(rng.sample(WORDS, 3))} {i}', price=rng.randint(100, 900),
+                 discount=rng.random() < 0.2, author_name=f'Author {rng.randint(1, authors)}',
+                 owner_id=rng.choice(owners))
+            for i in chunk_range(options, options['books'], chunk)
+        ], options['batch_size'])
+
+
+def create_relations(options, chunk):
+    rng = chunk_rng(options, 'relations', chunk)
+    users, books, cum_weights = _state['users'], _state['books'], _state['cum_weights']
+    rows = (
+        (users[i], book, rng.random() < options['like_ratio'], rng.random() < 0.1,
+         rng.choices(RATES, RATE_WEIGHTS)[0] if rng.random() < options['rate_ratio'] else None, '')
+        for i in chunk_range(options, len(users), chunk)
+        for book in pick_books(rng, books, cum_weights, options['relations'])
+    )
+    with transaction.atomic():
+        insert_relations(rows, options['batch_size'])
+
+
+def rebuild_chunk(options, chunk):
+    book_ids = [_state['books'][i] for i in chunk_range(options, len(_state['books']), chunk)]
+    rebuild_counters(book_ids=book_ids)
+
+
+def run_chunks(phase, options, total):
+    chunks = range((total + options['chunk_size'] - 1) // options['chunk_size'])
+    if options['workers'] == 1:
+        for chunk in chunks:
+            phase(options, chunk)
+        return
+    # forked workers must not share the parent's connection, each opens its own
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+        pool.starmap(phase, [(options, chunk) for chunk in chunks])
+
+
+def seed(users=1000, books=1000, relations=10, like_ratio=0.3, rate_ratio=0.5, seed=0, batch_size=5000,
+         chunk_size=10000, workers=1, log=None):
+    # Users, books and `relations` relations per user, the same dataset for the same arguments whatever
+    # the number of workers. Book popularity follows a 1/rank distribution, rates lean to the high end.
+    # Rows are inserted without save() or counter hooks, likes and ratings are rebuilt once at the end.
+    options = {'users': users, 'books': books, 'relations': relations, 'like_ratio': like_ratio,
+               'rate_ratio': rate_ratio, 'seed': seed, 'batch_size': batch_size, 'chunk_size': chunk_size,
+               'workers': workers}
+    log = log or (lambda message: None)
+
+    run_chunks(create_users, options, users)
+    # ordered by name, not by pk, so parallel inserts still map the same user and book to the same index
+    _state['users'] = list(User.objects.filter(username__startswith=PREFIX)
+                           .order_by('username').values_list('pk', flat=True))
+    _state['owners'] = _state['users'][:max(len(_state['users']) // 10, 1)]
+    log(f'Created {len(_state["users"])} users')
+
+    run_chunks(create_books, options, books)
+    _state['books'] = list(Book.objects.filter(name__startswith=PREFIX).order_by('name').values_list('pk', flat=True))
+    _state['cum_weights'] = list(accumulate(1 / rank for rank in range(1, len(_state['books']) + 1)))
+    log(f'Created {len(_state["books"])} books')
+
+    run_chunks(create_relations, options, users)
+    log('Created relations')
+    run_chunks(rebuild_chunk, options, books)
+    invalidate_all()
+    invalidate_search()
+    log('Rebuilt likes and ratings')
+
+    dataset = {'users': _state['users'], 'books': _state['books']}
+    _state.clear()
+    return dataset
+
+
+def check_scratch_database(database, option='--database '):
+    # Benchmarks seed into the default database and delete from it. That's always allowed on the database of a
+    # test run, any other one has to be named by `database` and is only used with DEBUG on. `option` is how the
+    # caller takes the name, scripts get it as a script argument.
+    name = str(connection.settings_dict['NAME'])
+    if name == str(connection.creation._get_test_db_name()):
+        return
+    if not settings.DEBUG:
+        raise CommandError(f'Refusing to seed and delete benchmark data in {name!r} with DEBUG off')
+    if database != name:
+        raise CommandError(f'Benchmark data is seeded into and deleted from {name!r}, '
+                           f'confirm it is a throwaway database with {option}{name}')
+
+
+def delete_seeded():
+    # Raw deletes skip per-row signals and counter updates, the seeded books go away together with their relations.
+    # Relations of seeded users to other books (e.g. written by a benchmark) are deleted as well, the counters of
+    # those books are rebuilt from the relations that are left and their version is bumped.
+    users = User.objects.filter(username__startswith=PREFIX)
+    books = Book.objects.filter(name__startswith=PREFIX)
+    relations = UserBookRelation.objects.filter(Q(user__in=users) | Q(book__in=books))
+    with transaction.atomic():
+        other_books = set(relations.exclude(book__in=books).values_list('book_id', flat=True).order_by())
+        # what on_delete=SET_NULL would do for other books owned by seeded users
+        owned = Book.objects.filter(owner__in=users).exclude(name__startswith=PREFIX)
+        other_books.update(owned.values_list('pk', flat=True))
+        owned.update(owner=None)
+        deleted = relations._raw_delete(relations.db)
+        deleted += books._raw_delete(books.db)
+        deleted += users._raw_delete(users.db)
+        if other_books:
+            rebuild_counters(book_ids=other_books)
+        invalidate_all()
+        invalidate_search()
+    return deleted
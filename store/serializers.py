@@ -1,7 +1,19 @@
+import decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection
+from django.db.models import CharField, Count, F, Func, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnDict
 
+from .instrumentation import TimedSerializerMixin, timer
 from .models import Book, UserBookRelation
 
 
@@ -9,27 +21,233 @@ class BookReaderSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = ('first_name', 'last_name')
-class BooksSerializer(ModelSerializer):
+
+
+class BooksListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    # BooksSerializer(many=True): the whole batch is one bulk_create / bulk_update
+    def create(self, validated_data):
+        return Book.objects.bulk_create([Book(**attrs) for attrs in validated_data], batch_size=1000)
+
+    @property
+    def errors(self):
+        # keyed by the position of the invalid items instead of a list with `{}` for every valid one
+        errors = super().errors
+        if isinstance(errors, list):
+            return ReturnDict({index: item for index, item in enumerate(errors) if item}, serializer=self)
+        return errors
+
+    def update(self, instances, validated_data):
+        # instances are in the order of the items, see BookViewSet.bulk_update
+        fields = set()
+        for book, attrs in zip(instances, validated_data):
+            for field, value in attrs.items():
+                setattr(book, field, value)
+            fields.update(attrs)
+        if fields:
+            Book.objects.bulk_update(instances, fields, batch_size=1000)
+        return instances
+
+
+class BooksSerializer(TimedSerializerMixin, ModelSerializer):
     # likes_count = serializers.SerializerMethodField()
-    annotated_likes = serializers.IntegerField(read_only=True)
+    annotated_likes = serializers.IntegerField(source='likes_count', read_only=True)
     # rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
     price_w_discount = serializers.DecimalField(max_digits=7, decimal_places=2, read_only=True)
     owner_name = serializers.CharField(read_only=True)
 
-    readers = BookReaderSerializer(many=True, read_only=True)
+    # the first settings.BOOK_READERS_LIMIT readers, from the prefetched readers when there are any
+    readers = serializers.SerializerMethodField()
+    readers_count = serializers.SerializerMethodField()
+    # the requesting user's relation, annotated by BookViewSet for signed in users only and skipped otherwise
+    my_like = serializers.BooleanField(read_only=True)
+    my_bookmark = serializers.BooleanField(read_only=True)
+    my_rate = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Book
         fields = (
             'id', 'name', 'price', 'price_w_discount', 'author_name', 'annotated_likes',
-            'rating', 'owner_name', 'readers')
+            'rating', 'owner_name', 'readers', 'readers_count', 'my_like', 'my_bookmark', 'my_rate')
+        list_serializer_class = BooksListSerializer
+
+    def get_readers(self, instance):
+        return BookReaderSerializer(instance.readers.all()[:settings.BOOK_READERS_LIMIT], many=True).data
+
+    def get_readers_count(self, instance):
+        return instance.readers.count()
 
     # we can create new serializer field instead of annotate function, but it creates more sql queries
     # def get_likes_count(self, instance):
     #     return UserBookRelation.objects.filter(book=instance, like=True).count()
 
 
-class UserBookRelationSerializer(ModelSerializer):
+def decimal_representation(max_digits, decimal_places):
+    # what serializers.DecimalField.to_representation returns, with the context and exponent built once
+    context = decimal.getcontext().copy()
+    context.prec = max_digits
+    exponent = decimal.Decimal('.1') ** decimal_places
+
+    def to_representation(value):
+        if value is None:
+            return None
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        quantized = value.quantize(exponent, context=context)
+        return '{:f}'.format(quantized) if api_settings.COERCE_DECIMAL_TO_STRING else quantized
+
+    return to_representation
+
+
+class ArraySlice(Func):
+    # the first `length` items of a PostgreSQL array
+    template = '(%(expressions)s)[1:%(length)d]'
+
+
+def readers_by_book(book_ids):
+    # {book id: (first BOOK_READERS_LIMIT readers, readers count)} of many books with one query,
+    # readers in the order of the readers Prefetch of BookViewSet
+    if not book_ids:
+        return {}
+    rows, collect = readers_query(book_ids)
+    return collect(rows)
+
+
+async def areaders_by_book(book_ids):
+    # readers_by_book for async views. Not with aiterator(): values_list() rows in another order than the
+    # selected columns are read as soon as the iterable is created, synchronously inside the event loop.
+    if not book_ids:
+        return {}
+    return await sync_to_async(readers_by_book)(book_ids)
+
+
+def readers_query(book_ids):
+    # the rows of readers_by_book and the function collecting them into its dict
+    limit = settings.BOOK_READERS_LIMIT
+    relations = UserBookRelation.objects.filter(book_id__in=book_ids).order_by()
+
+    if settings.BOOK_READERS_MODE == 'aggregate' and connection.vendor == 'postgresql':
+        # one row per book, names beyond the limit never leave the database
+        names = {}
+        for field in ('first_name', 'last_name'):
+            names[f'{field}s'] = ArrayAgg(f'user__{field}', ordering='user_id')
+            if limit is not None:
+                names[f'{field}s'] = ArraySlice(names[f'{field}s'], length=int(limit),
+                                                output_field=ArrayField(CharField()))
+        rows = relations.values('book_id').annotate(total=Count('pk'), **names).values_list(
+            'book_id', 'total', 'first_names', 'last_names')
+
+        def collect(rows):
+            return {book_id: ([{'first_name': first_name, 'last_name': last_name}
+                               for first_name, last_name in zip(first_names, last_names)], total)
+                    for book_id, total, first_names, last_names in rows}
+
+        return rows, collect
+
+    if settings.BOOK_READERS_MODE == 'rows':
+        # one row per reader, the limit is applied here
+        rows = relations.order_by('book_id', 'user_id').values_list('book_id', 'user__first_name', 'user__last_name')
+
+        def collect(rows):
+            readers = {}
+            for book_id, first_name, last_name in rows:
+                book_readers, total = readers.get(book_id, ([], 0))
+                if limit is None or total < limit:
+                    book_readers.append({'first_name': first_name, 'last_name': last_name})
+                readers[book_id] = (book_readers, total + 1)
+            return readers
+
+        return rows, collect
+
+    # numbered per book by a window function, rows beyond the limit are filtered out in the database
+    relations = relations.annotate(
+        position=Window(RowNumber(), partition_by=F('book_id'), order_by=F('user_id').asc()),
+        total=Window(Count('pk'), partition_by=F('book_id')),
+    )
+    if limit is not None:
+        relations = relations.filter(position__lte=limit)
+    rows = relations.order_by('book_id', 'user_id').values_list(
+        'book_id', 'total', 'user__first_name', 'user__last_name')
+
+    def collect(rows):
+        readers = {}
+        for book_id, total, first_name, last_name in rows:
+            readers.setdefault(book_id, ([], total))[0].append({'first_name': first_name, 'last_name': last_name})
+        return readers
+
+    return rows, collect
+
+
+class BooksRowSerializer:
+    # Read-only BooksSerializer for `.values()` rows, builds the same dicts without DRF's per row and per field
+    # machinery or User instances, readers come aggregated per book (see readers_by_book).
+    # Has to stay equal to BooksSerializer, see tests.test_serializers.
+    values = ('id', 'name', 'price', 'price_w_discount', 'author_name', 'likes_count', 'rating', 'owner_name')
+    # selected and serialized only when the queryset has them annotated
+    optional_values = ('my_like', 'my_bookmark', 'my_rate')
+
+    price = staticmethod(decimal_representation(7, 2))
+    price_w_discount = staticmethod(decimal_representation(7, 2))
+    rating = staticmethod(decimal_representation(3, 2))
+
+    def __init__(self, instance, many=False):
+        self.instance = instance
+        self.many = many
+
+    @property
+    def data(self):
+        with timer('serialize'):
+            rows = list(self.instance) if self.many else [self.instance]
+            readers = readers_by_book([row['id'] for row in rows])
+            data = [self.to_representation(row, readers) for row in rows]
+        return data if self.many else data[0]
+
+    async def adata(self):
+        # .data for async views, `instance` is an already read row or list of rows
+        rows = self.instance if self.many else [self.instance]
+        readers = await areaders_by_book([row['id'] for row in rows])
+        with timer('serialize'):
+            data = [self.to_representation(row, readers) for row in rows]
+        return data if self.many else data[0]
+
+    def to_representation(self, row, readers):
+        owner_name = row['owner_name']
+        book_readers, readers_count = readers.get(row['id'], ([], 0))
+        data = {
+            'id': row['id'],
+            'name': str(row['name']),
+            'price': self.price(row['price']),
+            'price_w_discount': self.price_w_discount(row['price_w_discount']),
+            'author_name': str(row['author_name']),
+            'annotated_likes': int(row['likes_count']),
+            'rating': self.rating(row['rating']),
+            'owner_name': None if owner_name is None else str(owner_name),
+            'readers': book_readers,
+            'readers_count': readers_count,
+        }
+        if 'my_like' in row:
+            data['my_like'] = bool(row['my_like'])
+            data['my_bookmark'] = bool(row['my_bookmark'])
+            data['my_rate'] = None if row['my_rate'] is None else int(row['my_rate'])
+        return data
+
+
+class UserBookRelationSerializer(TimedSerializerMixin, ModelSerializer):
+    class Meta:
+        model = UserBookRelation
+        fields = ('book', 'like', 'in_bookmarks', 'rate', 'comments')
+
+
+class UserBookRelationUpdateSerializer(ModelSerializer):
+    # the book comes from the URL, without a related field validation needs no queries and runs in async views
+    class Meta:
+        model = UserBookRelation
+        fields = ('like', 'in_bookmarks', 'rate', 'comments')
+
+
+class UserBookRelationBulkSerializer(ModelSerializer):
+    # a plain id, books of the whole batch are looked up with one query in the view
+    book = serializers.IntegerField()
+
     class Meta:
         model = UserBookRelation
         fields = ('book', 'like', 'in_bookmarks', 'rate', 'comments')
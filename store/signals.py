@@ -0,0 +1,69 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from store.cache import books_changed, invalidate_books, invalidate_search
+from store.listing import refresh_listings
+from store.logic import touch_books, update_counters
+from store.models import Book, UserBookRelation
+
+# user fields that end up in BooksSerializer as owner_name and readers
+SERIALIZED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def deleted_with_books(origin):
+    # a delete started by a book, invalidated by its own post_delete, or by BookQuerySet.delete, which
+    # invalidates all its books at once
+    return isinstance(origin, Book) or (isinstance(origin, QuerySet) and origin.model is Book)
+
+
+@receiver(post_delete, sender=UserBookRelation)
+def relation_deleted(sender, instance, origin=None, **kwargs):
+    # also fired for cascade deletes of users, so counters stay in sync. Relations deleted together with
+    # their book need neither counters nor another invalidation of the book.
+    if deleted_with_books(origin):
+        return
+    update_counters(instance.book_id, old_like=instance.like, old_rate=instance.rate, touch=True)
+    invalidate_books([instance.book_id])
+
+
+@receiver(post_save, sender=UserBookRelation)
+def relation_saved(sender, instance, **kwargs):
+    invalidate_books({instance.book_id, instance.old_book_id} - {None})
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, QuerySet) and origin.model is Book:
+        # BookQuerySet.delete invalidates the whole batch
+        return
+    invalidate_books([instance.pk])
+    invalidate_search()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not SERIALIZED_USER_FIELDS.intersection(update_fields)):
+        return
+    touch_books(set(Book.objects.filter(Q(owner=instance) | Q(readers=instance)).values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # owned books are only SET_NULL by a bulk UPDATE, without Book signals
+    touch_books(list(Book.objects.filter(owner=instance).values_list('pk', flat=True)))
+
+
+@receiver(books_changed)
+def refresh_book_listings(sender, book_ids, **kwargs):
+    # every path that changes a listed book invalidates its cache tokens, so BookListing follows the same calls.
+    # Refreshed after commit and before the tokens are bumped again, a failed refresh is logged and shows up
+    # as lag in `/metrics/listings/` until the next change of the book or `manage.py rebuild_listings`.
+    if settings.BOOK_LISTING:
+        transaction.on_commit(partial(refresh_listings, book_ids), robust=True)
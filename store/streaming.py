@@ -0,0 +1,27 @@
+import json
+from itertools import islice
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def serialize_in_chunks(queryset, serializer_class, chunk_size):
+    # iterator() with chunk_size runs prefetch_related per chunk, so only one chunk is kept in memory
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield from serializer_class(chunk, many=True).data
+
+
+def dumps(item):
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def json_array(items):
+    yield '['
+    for i, item in enumerate(items):
+        yield dumps(item) if i == 0 else ',' + dumps(item)
+    yield ']'
+
+
+def ndjson(items):
+    for item in items:
+        yield dumps(item) + '\n'
@@ -1,38 +1,170 @@
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count, Case, When, Avg, F, Prefetch
+from django.db.models import F, Prefetch, FilteredRelation, Q, Value
+from django.db.models.functions import Coalesce
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.mixins import UpdateModelMixin, RetrieveModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from .cache import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .instrumentation import metrics_snapshot
+from .listing import listing_queryset, listing_stats, price_w_discount
 from .models import Book, UserBookRelation
+from .pagination import KeysetPagination
+from .pooling import pool_stats
 from .permissions import IsOwnerOrStaffOrReadOnly
-from .serializers import BooksSerializer, UserBookRelationSerializer
+from .replicas import ReplicaReadMixin
+from .rows import RowsReadMixin
+from .search import BookSearchFilter, autocomplete
+from .logic import upsert_relation, upsert_relations
+from .serializers import (BooksSerializer, BooksRowSerializer, UserBookRelationSerializer,
+                          UserBookRelationBulkSerializer, UserBookRelationUpdateSerializer)
+from .streaming import serialize_in_chunks, json_array, ndjson
 
 
 # Create your views here.
 
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all().annotate(annotated_likes=Count(Case(When(userbookrelation__like=True, then=1))),
-                                           price_w_discount=Case(When(discount=True, then=F('price') - 100),
-                                                                 default=F('price')),
+def annotate_my_relation(queryset, user):
+    # the user's own relation is a LEFT JOIN of the main query, (user, book) is unique so rows don't repeat
+    return queryset.annotate(
+        my_relation=FilteredRelation('userbookrelation', condition=Q(userbookrelation__user=user)),
+        my_like=Coalesce('my_relation__like', Value(False)),
+        my_bookmark=Coalesce('my_relation__in_bookmarks', Value(False)),
+        my_rate=F('my_relation__rate'),
+    )
+
+
+class BookViewSet(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, RowsReadMixin, ModelViewSet):
+    # readers are ordered like store.serializers.readers_by_book of the list/retrieve fast path
+    queryset = Book.objects.all().annotate(price_w_discount=price_w_discount(),
                                            owner_name=F('owner__username')
                                            ).prefetch_related(
-        Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('id')
+        Prefetch('readers', queryset=User.objects.only("first_name", "last_name").order_by('id'))).order_by('id')
     serializer_class = BooksSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    row_serializer_class = BooksRowSerializer
+    row_extra_fields = ('version', 'modified_at')
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, OrderingFilter]
     permission_classes = [IsOwnerOrStaffOrReadOnly]
     filterset_fields = ['price']
-    search_fields = ['name', 'author_name']
     ordering_fields = ['price', 'author_name']
 
+    stream_chunk_size = 2000
+    max_stream_chunk_size = 10000
+    max_bulk_size = 10000
+    autocomplete_limit = 10
+    max_autocomplete_limit = 50
+
+    def get_queryset(self):
+        if self.reads_listing():
+            return listing_queryset(self.request.user)
+        queryset = super().get_queryset()
+        if self.request.user.is_authenticated:
+            queryset = annotate_my_relation(queryset, self.request.user)
+        return queryset
+
+    def reads_listing(self):
+        # list/retrieve rows come precomputed from BookListing, `?search=` ranks Book rows of store.search
+        return (settings.BOOK_LISTING and self.action in ('list', 'retrieve') and
+                not self.request.query_params.get(BookSearchFilter.search_param))
+
+    def get_vary_key(self, request):
+        # my_like, my_bookmark and my_rate make the books of every signed in user different
+        return f'user:{request.user.pk}' if request.user.is_authenticated else ''
+
     def perform_create(self, serializer):
         serializer.validated_data['owner'] = self.request.user
         serializer.save()
 
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'])
+    def bulk(self, request):
+        # lists of books in one request and one transaction: POST creates, PUT/PATCH update by id, DELETE takes ids
+        with transaction.atomic():
+            if request.method == 'POST':
+                return self.bulk_create(request)
+            if request.method == 'DELETE':
+                return self.bulk_destroy(request)
+            return self.bulk_update(request, partial=request.method == 'PATCH')
+
+    def bulk_create(self, request):
+        if not request.user.is_authenticated:
+            raise NotAuthenticated()
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False,
+                                         max_length=self.max_bulk_size)
+        serializer.is_valid(raise_exception=True)
+        books = serializer.save(owner=request.user)
+        return Response({'ids': [book.pk for book in books]}, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request, partial):
+        ids = self.get_bulk_ids(request.data, key='id')
+        books = self.get_bulk_books(ids)
+        serializer = self.get_serializer([books[pk] for pk in ids], data=request.data, many=True, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({'ids': ids})
+
+    def bulk_destroy(self, request):
+        ids = self.get_bulk_ids(request.data)
+        self.get_bulk_books(ids)
+        Book.objects.filter(pk__in=ids).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_bulk_ids(self, data, key=None):
+        if not isinstance(data, list) or not 0 < len(data) <= self.max_bulk_size:
+            raise ValidationError(f'Expected a list of 1 to {self.max_bulk_size} items.')
+        try:
+            ids = [int(item[key] if key else item) for item in data]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError('Every item needs an integer id.')
+        if len(set(ids)) != len(ids):
+            raise ValidationError('Every book can be listed only once.')
+        return ids
+
+    def get_bulk_books(self, ids):
+        # one query for the whole batch, IsOwnerOrStaffOrReadOnly then only compares owner ids
+        books = Book.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in books]
+        if missing:
+            raise NotFound(f'Books not found: {missing}.')
+        for book in books.values():
+            self.check_object_permissions(self.request, book)
+        return books
+
+    @action(detail=False)
+    def stream(self, request):
+        # whole filtered list without pagination, rows are serialized and sent chunk by chunk
+        try:
+            chunk_size = min(int(request.query_params['chunk_size']), self.max_stream_chunk_size)
+        except (KeyError, ValueError):
+            chunk_size = self.stream_chunk_size
+        books = serialize_in_chunks(self.filter_queryset(self.get_queryset()), self.get_serializer_class(),
+                                    max(chunk_size, 1))
+        if request.query_params.get('stream_format') == 'ndjson':
+            return StreamingHttpResponse(ndjson(books), content_type='application/x-ndjson')
+        return StreamingHttpResponse(json_array(books), content_type='application/json')
+
+    @action(detail=False)
+    def autocomplete(self, request):
+        # ids and labels only, `?q=flu` finds "Fluent Python" and "The Fluent Reader"
+        try:
+            limit = min(int(request.query_params['limit']), self.max_autocomplete_limit)
+        except (KeyError, ValueError):
+            limit = self.autocomplete_limit
+        results = autocomplete(Book.objects.all(), request.query_params.get('q', ''), max(limit, 1))
+        return Response({'books': results['name'], 'authors': results['author_name']})
+
 
 class UserBookRelationView(UpdateModelMixin, GenericViewSet):
     permission_classes = [IsAuthenticated]
@@ -40,10 +172,71 @@ class UserBookRelationView(UpdateModelMixin, GenericViewSet):
     serializer_class = UserBookRelationSerializer
     lookup_field = 'book'
 
-    def get_object(self):
-        obj, _ = UserBookRelation.objects.get_or_create(user=self.request.user, book_id=self.kwargs['book'])
-        # print('Created', _)
-        return obj
+    def update(self, request, *args, **kwargs):
+        # PUT/PATCH create the relation when it's missing, with one upsert on PostgreSQL (store.logic)
+        try:
+            book_id = int(self.kwargs['book'])
+        except ValueError:
+            raise NotFound()
+        serializer = UserBookRelationUpdateSerializer(data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        try:
+            relation, _ = upsert_relation(request.user, book_id, serializer.validated_data)
+        except Book.DoesNotExist:
+            raise NotFound()
+        return Response(UserBookRelationSerializer(relation).data)
+
+    max_bulk_size = 1000
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # [{book, like, in_bookmarks, rate, comments}, ...] of the current user, valid items are upserted
+        # together and every invalid one is reported with its position in the batch
+        if not isinstance(request.data, list) or not 0 < len(request.data) <= self.max_bulk_size:
+            return Response({'detail': f'Expected a list of 1 to {self.max_bulk_size} items.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializers = [UserBookRelationBulkSerializer(data=item) for item in request.data]
+        valid = [serializer for serializer in serializers if serializer.is_valid()]
+        book_ids = {serializer.validated_data['book'] for serializer in valid}
+        existing = set(Book.objects.filter(pk__in=book_ids).values_list('pk', flat=True))
+        errors, items = [], []
+        for index, serializer in enumerate(serializers):
+            if serializer.errors:
+                errors.append({'index': index, 'errors': serializer.errors})
+            elif serializer.validated_data['book'] not in existing:
+                message = f'Invalid pk "{serializer.validated_data["book"]}" - object does not exist.'
+                errors.append({'index': index, 'errors': {'book': [message]}})
+            else:
+                items.append(serializer.validated_data)
+
+        result = upsert_relations(request.user, items) if items else {'created': 0, 'updated': 0}
+        return Response({**result, 'errors': errors},
+                        status=status.HTTP_200_OK if items or not errors else status.HTTP_400_BAD_REQUEST)
+
+
+class MetricsView(APIView):
+    # per route histograms collected by store.instrumentation.InstrumentationMiddleware in this process
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics_snapshot())
+
+
+class ListingStatsView(APIView):
+    # size and staleness of the BookListing read model, see store.listing
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(listing_stats())
+
+
+class PoolStatsView(APIView):
+    # connection pools of this process per database alias, see store.pooling
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
 
 
 def auth(request):
@@ -49,11 +49,13 @@ INTERNAL_IPS = [
 ]
 
 MIDDLEWARE = [
+    'store.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.replicas.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -85,25 +87,66 @@ WSGI_APPLICATION = 'testdrf.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# 'store.db.postgresql' is the stock PostgreSQL backend with connections from an in-process pool per database,
+# configured by POOL: up to max_size connections, waiting `timeout` seconds for a free one, replacing them after
+# max_lifetime, closing the ones idle for max_idle beyond min_size and probing the ones idle for check_after.
+# Django returns the connection after every request (CONN_MAX_AGE 0), see store.pooling and `/metrics/pools/`.
+# With a stock ENGINE, connections can be kept per thread instead with e.g. CONN_MAX_AGE 60 and
+# CONN_HEALTH_CHECKS True.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'store.db.postgresql',
         'NAME': 'books_db',
         'USER': 'books_user',
         'PASSWORD': '1',
         'HOST': 'localhost',
         'PORT': '',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'max_size': 20,
+            'min_size': 2,
+            'timeout': 10,
+            'max_lifetime': 30 * 60,
+            'max_idle': 5 * 60,
+            'check_after': 30,
+        },
         'TEST': {
             'NAME': 'test_books_db',
         },
     }
 }
 
+# Aliases of DATABASES holding replicas of 'default'. Safe BookViewSet requests and the rating aggregate reads
+# go to one of them, see store.replicas. Locally a second database (e.g. a copy of the SQLite file or another
+# Postgres database) can stand in for a replica.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['store.replicas.ReplicaRouter']
+# assumed max replication lag: users read from the primary this long after their own writes,
+# and responses read from a replica are cached no longer than this
+REPLICA_LAG_SECONDS = 5
+
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.github.GithubOAuth2',
     'django.contrib.auth.backends.ModelBackend',
 )
 
+# Version tokens of cached book responses (store.cache) and replica pins live in the default cache, which has
+# to be shared by every worker process. A process-local one fails the store.E001 check, see store.checks.
+# The file cache is shared by the workers of one host. With workers on several hosts use a networked cache,
+# e.g. 'django.core.cache.backends.redis.RedisCache' (needs redis-py) at 'redis://<host>:6379/1'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/testdrf_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# seconds a /book/ list or detail response stays cached, writes invalidate it earlier
+BOOK_CACHE_TIMEOUT = 60 * 5
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,13 +187,43 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # orjson based, the same bytes as rest_framework.renderers.JSONRenderer / JSONParser,
+    # which they fall back to without orjson installed
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'store.renderers.ORJSONRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'rest_framework.parsers.JSONParser',
-    )
+        'store.renderers.ORJSONParser',
+    ),
+}
+
+# readers listed per book by BooksSerializer (None lists all of them), `readers_count` has the total.
+# 'aggregate' collects them per book in the database (ARRAY_AGG on PostgreSQL, a window function elsewhere),
+# 'rows' reads one row per reader and applies the limit in Python
+BOOK_READERS_LIMIT = 50
+BOOK_READERS_MODE = 'aggregate'
+
+# 'sync' updates book rating counters inside the request,
+# 'deferred' only marks the book and leaves the recompute to `manage.py rating_worker`
+RATING_UPDATE_MODE = 'sync'
+RATING_FLUSH_INTERVAL = 1.0
+
+# BookViewSet list/retrieve (without `?search=`) read precomputed rows of store.models.BookListing, refreshed
+# after every commit changing a book. Run `manage.py rebuild_listings` after turning it on.
+BOOK_LISTING = False
+
+# SQL queries allowed per request of a route (view name), including session and user lookups.
+# Breaches are logged by store.instrumentation, timings go out as a Server-Timing header.
+QUERY_BUDGETS = {
+    'book-list': 4,
+    'book-detail': 4,
+    'book-autocomplete': 4,
+    'userbookrelation-detail': 6,
+    'async-book-list': 4,
+    'async-book-detail': 4,
+    'async-userbookrelation-detail': 6,
 }
+SERVER_TIMING = True
 
 SOCIAL_AUTH_JSONFIELD_ENABLED = True
 SOCIAL_AUTH_GITHUB_KEY = 'key'
@@ -18,7 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 
-from store.views import BookViewSet, auth, UserBookRelationView
+from store.async_views import AsyncBookDetailView, AsyncBookListView, AsyncUserBookRelationView
+from store.views import BookViewSet, auth, UserBookRelationView, MetricsView, PoolStatsView, ListingStatsView
 from . import settings
 
 
@@ -31,6 +32,14 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('social_django.urls', namespace='social')),
     path('oauth/', auth),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('metrics/pools/', PoolStatsView.as_view(), name='metrics-pools'),
+    path('metrics/listings/', ListingStatsView.as_view(), name='metrics-listings'),
+    # ASGI-native variants of the hot routes, see store.async_views
+    path('async/book/', AsyncBookListView.as_view(), name='async-book-list'),
+    path('async/book/<int:pk>/', AsyncBookDetailView.as_view(), name='async-book-detail'),
+    path('async/book_relation/<int:book>/', AsyncUserBookRelationView.as_view(),
+         name='async-userbookrelation-detail'),
 ]
 
 urlpatterns += router.urls
@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    # Runs the same request against a growing dataset, so a serializer field or signal that
+    # issues a query per row (N+1) shows up as a query count that changes with the size.
+    query_count_sizes = (1, 10, 100)
+
+    def grow(self, size):
+        # brings the dataset of the test case to `size` rows
+        raise NotImplementedError
+
+    def assertQueryCountConstant(self, request, sizes=None, budget=None):
+        sizes = sizes or self.query_count_sizes
+        counts = []
+        for size in sizes:
+            self.grow(size)
+            # a cached response costs no queries at all and would hide the real count
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+            counts.append(len(queries))
+
+        if len(set(counts)) > 1:
+            sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+            self.fail(f'Query count grows with data {dict(zip(sizes, counts))}, queries at {sizes[-1]} rows:\n{sql}')
+        if budget is not None:
+            self.assertLessEqual(counts[0], budget)
+        return counts[0]
@@ -1,7 +1,9 @@
 import json
+from base64 import urlsafe_b64encode
 from unittest import mock
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import connection
 from django.db.models import Count, Case, When, Avg, F, Prefetch
 from django.urls import reverse
@@ -11,6 +13,7 @@ from rest_framework.exceptions import ErrorDetail
 from rest_framework.test import APITestCase
 
 from store.models import Book, UserBookRelation
+from store.search import BookSearchFilter
 from store.serializers import BooksSerializer
 
 
@@ -48,7 +51,7 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('id')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
         self.assertEqual(serializer_data[2]['rating'], '5.00')
         self.assertEqual(serializer_data[2]['annotated_likes'], 1)
 
@@ -152,10 +155,11 @@ class BooksApiTestCase(APITestCase):
                                   default=F('price')),
             owner_name=F('owner__username')
         ).prefetch_related(
-            Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('id')
+            Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('-id')
+        # ranked by relevance, book 3 mentions "Author" twice
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_get_ordering_price(self):
         url = reverse('book-list')
@@ -169,7 +173,7 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('price')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_get_ordering_price_2(self):
         url = reverse('book-list')
@@ -183,7 +187,7 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('-price')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_get_ordering_author_name(self):
         url = reverse('book-list')
@@ -197,7 +201,7 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('author_name')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_get_ordering_author_name_2(self):
         url = reverse('book-list')
@@ -211,7 +215,7 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('-author_name')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_price_without_discount(self):
         url = reverse('book-list')
@@ -225,7 +229,7 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('-author_name')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual('450.00', response.data[1]['price_w_discount'])
+        self.assertEqual('450.00', response.data['results'][1]['price_w_discount'])
 
     def test_price_with_discount(self):
         url = reverse('book-list')
@@ -239,9 +243,133 @@ class BooksApiTestCase(APITestCase):
             Prefetch('readers', queryset=User.objects.only("first_name", "last_name"))).order_by('-author_name')
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual('150.00', response.data[0]['price_w_discount'])
+        self.assertEqual('150.00', response.data['results'][0]['price_w_discount'])
+
+
+class BooksPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.books = [
+            create_book(name=f'Test book {i}', price=price, author_name=author, owner=self.user, discount=False)
+            for i, (price, author) in enumerate([(300, 'Author B'), (100, 'Author A'), (300, 'Author A'),
+                                                 (200, 'Author C'), (300, 'Author B')])
+        ]
+
+    def get_pages(self, params, between_pages=None):
+        pages = []
+        url = reverse('book-list')
+        response = self.client.get(url, data=params)
+        while True:
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            pages.append([book['id'] for book in response.data['results']])
+            if not response.data['next']:
+                return pages
+            if between_pages:
+                between_pages()
+            response = self.client.get(response.data['next'])
+
+    def test_pages(self):
+        pages = self.get_pages({'page_size': 2})
+        self.assertEqual([[self.books[0].id, self.books[1].id], [self.books[2].id, self.books[3].id],
+                          [self.books[4].id]], pages)
 
+    def test_page_size_limits(self):
+        url = reverse('book-list')
+        response = self.client.get(url)
+        self.assertEqual(5, len(response.data['results']))
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(url, data={'page_size': 0})
+        self.assertEqual(1, len(response.data['results']))
+
+    def test_ordering_tie_breaker(self):
+        by_price = sorted(self.books, key=lambda book: (book.price, book.id))
+        pages = self.get_pages({'page_size': 2, 'ordering': 'price'})
+        self.assertEqual([book.id for book in by_price], sum(pages, []))
+
+        by_author = sorted(self.books, key=lambda book: (book.author_name, book.id), reverse=True)
+        pages = self.get_pages({'page_size': 2, 'ordering': '-author_name'})
+        self.assertEqual([book.id for book in by_author], sum(pages, []))
 
+        # mixed directions, the tie-breaker follows the first field
+        by_author = sorted(sorted(self.books, key=lambda book: book.id), key=lambda book: book.author_name,
+                           reverse=True)
+        by_price_author = sorted(by_author, key=lambda book: book.price)
+        pages = self.get_pages({'page_size': 2, 'ordering': 'price,-author_name'})
+        self.assertEqual([book.id for book in by_price_author], sum(pages, []))
+
+    def test_concurrent_inserts(self):
+        inserted = []
+
+        def insert():
+            # rows landing before the cursor must not shift the next page, rows after it are returned once
+            inserted.append(create_book(name='New cheap', price=50, author_name='Author Z', owner=self.user,
+                                        discount=False))
+            inserted.append(create_book(name='New tie', price=300, author_name='Author Z', owner=self.user,
+                                        discount=False))
+
+        ids = sum(self.get_pages({'page_size': 2, 'ordering': 'price'}, between_pages=insert), [])
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertTrue({book.id for book in self.books}.issubset(ids))
+        self.assertFalse({book.id for book in inserted if book.name == 'New cheap'} & set(ids))
+
+    def test_cursor_queries(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'page_size': 2, 'ordering': 'price'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response.data['next'])
+        self.assertEqual(2, len(queries))
+        self.assertIn('LIMIT 3', queries[0]['sql'])
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        # one row value bound the (price, id) index can seek to, not an OR chain
+        self.assertRegex(queries[0]['sql'], r'\([^()]*"price", [^()]*"id"\) > \(')
+
+    def test_invalid_cursor(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'page_size': 2, 'ordering': 'price'})
+        response = self.client.get(response.data['next'].replace('ordering=price', 'ordering=author_name'))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        response = self.client.get(url, data={'cursor': 'broken'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        # values that aren't of the ordering fields' types
+        for values in (['abc', 1], [300, {'id': 1}]):
+            cursor = urlsafe_b64encode(json.dumps({'o': ['price', 'id'], 'v': values}).encode()).decode()
+            response = self.client.get(url, data={'ordering': 'price', 'cursor': cursor})
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class BooksStreamTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.books = [create_book(name=f'Test book {i}', price=100 + i, author_name=f'Author {i}',
+                                  owner=self.user, discount=i % 2 == 0) for i in range(7)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[3], like=True, rate=4)
+
+    def expected(self, **params):
+        response = self.client.get(reverse('book-list'), data=dict(page_size=100, **params))
+        return json.loads(json.dumps(response.data['results']))
+
+    def test_json_array(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-stream'), data={'chunk_size': 3})
+            content = b''.join(response.streaming_content)
+        # one readers prefetch per chunk of 3 rows
+        prefetches = [query for query in queries if 'store_userbookrelation' in query['sql']]
+        self.assertEqual(3, len(prefetches))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+        self.assertEqual(self.expected(), json.loads(content))
+
+    def test_ndjson_filtered(self):
+        response = self.client.get(reverse('book-stream'),
+                                   data={'stream_format': 'ndjson', 'ordering': '-price', 'search': 'Author 3'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual('application/x-ndjson', response['Content-Type'])
+        self.assertEqual(self.expected(ordering='-price', search='Author 3'), [json.loads(line) for line in lines])
+
+    def test_empty(self):
+        Book.objects.all().delete()
+        response = self.client.get(reverse('book-stream'))
+        self.assertEqual([], json.loads(b''.join(response.streaming_content)))
 
 
 class BooksRelationTestCase(APITestCase):
@@ -306,5 +434,336 @@ class BooksRelationTestCase(APITestCase):
         self.client.force_login(self.user)
         response = self.client.patch(url, data=json_data, content_type='application/json')
         self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, response.data)
+        # validated before anything is stored
+        self.assertFalse(UserBookRelation.objects.filter(user=self.user, book=self.book_1).exists())
+
+    def test_missing_book(self):
+        self.client.force_login(self.user)
+        for book in (self.book_3.id + 1, 'abc'):
+            response = self.client.patch(reverse('userbookrelation-detail', args=(book,)),
+                                         data=json.dumps({'like': True}), content_type='application/json')
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_omitted_fields(self):
+        # omitted fields keep their stored values, on create they get their defaults
+        url = reverse('userbookrelation-detail', args=(self.book_1.id,))
+        self.client.force_login(self.user)
+        response = self.client.patch(url, data=json.dumps({'like': True, 'rate': 4}), content_type='application/json')
+        self.assertEqual({'book': self.book_1.id, 'like': True, 'in_bookmarks': False, 'rate': 4, 'comments': ''},
+                         response.data)
+        response = self.client.put(url, data=json.dumps({'comments': 'Nice'}), content_type='application/json')
+        self.assertEqual({'book': self.book_1.id, 'like': True, 'in_bookmarks': False, 'rate': 4, 'comments': 'Nice'},
+                         response.data)
+        self.book_1.refresh_from_db()
+        self.assertEqual((1, '4.00'), (self.book_1.likes_count, f'{self.book_1.rating:.2f}'))
+
+
+class BooksMyRelationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.user2 = User.objects.create(username='test_username2')
+        self.book_1 = create_book(name='Test book 1', price=250, author_name='Author A', owner=self.user,
+                                  discount=False)
+        self.book_2 = create_book(name='Test book 2', price=450, author_name='Author B', owner=self.user,
+                                  discount=False)
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, in_bookmarks=True)
+
+    def get_list(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [(book['id'], book['my_like'], book['my_bookmark'], book['my_rate'])
+                for book in response.data['results']]
+
+    def test_anonymous(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertNotIn('my_like', response.data['results'][0])
+        response = self.client.get(reverse('book-detail', args=(self.book_1.id,)))
+        self.assertNotIn('my_rate', response.data)
+
+    def test_list_and_detail(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            books = self.get_list()
+        self.assertEqual(2, len(queries))
+        self.assertEqual([(self.book_1.id, True, False, 4), (self.book_2.id, False, False, None)], books)
+        response = self.client.get(reverse('book-detail', args=(self.book_1.id,)))
+        self.assertEqual((True, False, 4), (response.data['my_like'], response.data['my_bookmark'],
+                                            response.data['my_rate']))
+
+        # not the cached list of the first user
+        self.client.force_authenticate(self.user2)
+        self.assertEqual([(self.book_1.id, False, True, None), (self.book_2.id, False, False, None)], self.get_list())
+
+    def test_bookmark_changes_etag(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('book-detail', args=(self.book_1.id,))
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(reverse('userbookrelation-detail', args=(self.book_1.id,)),
+                                     data=json.dumps({'in_bookmarks': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.data['my_bookmark'])
+
+
+class BooksSearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book_1 = create_book(name='Python Crash Course', price=100, author_name='Eric Matthes', owner=self.user,
+                                  discount=False)
+        self.book_2 = create_book(name='Fluent Python', price=200, author_name='Luciano Ramalho', owner=self.user,
+                                  discount=False)
+        self.book_3 = create_book(name='Python Python Python', price=300, author_name='Monty', owner=self.user,
+                                  discount=False)
+
+    def search(self, **params):
+        response = self.client.get(reverse('book-list'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book['id'] for book in response.data['results']]
+
+    def test_ranked(self):
+        self.assertEqual([self.book_3.id, self.book_1.id, self.book_2.id], self.search(search='python'))
+
+    def test_all_terms_prefix(self):
+        self.assertEqual([self.book_2.id], self.search(search='pyth rama'))
+        self.assertEqual([], self.search(search='python tolstoy'))
+        self.assertEqual([self.book_1.id, self.book_2.id, self.book_3.id], self.search(search='  ,'))
+
+    def test_ordering_and_pages(self):
+        self.assertEqual([self.book_3.id, self.book_2.id, self.book_1.id],
+                         self.search(search='python', ordering='-price'))
+        response = self.client.get(reverse('book-list'), data={'search': 'python', 'page_size': 2})
+        response = self.client.get(response.data['next'])
+        self.assertEqual([self.book_2.id], [book['id'] for book in response.data['results']])
+
+    def test_fallback_candidates(self):
+        # without full-text search only the best scored matches are found
+        cache.clear()
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            with mock.patch.object(BookSearchFilter, 'max_candidates', 2):
+                self.assertEqual([self.book_3.id, self.book_1.id], self.search(search='python'))
+
+    def test_index_follows_writes(self):
+        self.assertEqual([], self.search(search='tolstoy'))
+        self.book_1.author_name = 'Leo Tolstoy'
+        self.book_1.save()
+        self.assertEqual([self.book_1.id], self.search(search='tolstoy'))
+        self.book_1.delete()
+        self.assertEqual([], self.search(search='tolstoy'))
+
+
+class BooksAutocompleteTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book_1 = create_book(name='Python Crash Course', price=100, author_name='Eric Matthes', owner=self.user,
+                                  discount=False)
+        self.book_2 = create_book(name='Fluent Python', price=200, author_name='Luciano Ramalho', owner=self.user,
+                                  discount=False)
+        self.book_3 = create_book(name='Python Tricks', price=300, author_name='Luciano Ramalho', owner=self.user,
+                                  discount=False)
+
+    def autocomplete(self, **params):
+        response = self.client.get(reverse('book-autocomplete'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_books(self):
+        data = self.autocomplete(q='pyth')
+        self.assertEqual([{'id': self.book_1.id, 'label': 'Python Crash Course'},
+                          {'id': self.book_3.id, 'label': 'Python Tricks'},
+                          {'id': self.book_2.id, 'label': 'Fluent Python'}], data['books'])
+        self.assertEqual([], data['authors'])
+        self.assertEqual([self.book_1.id], [book['id'] for book in self.autocomplete(q='PYTHON  cr')['books']])
+        self.assertEqual([], self.autocomplete(q='ython')['books'])
+
+    def test_authors(self):
+        data = self.autocomplete(q='ram')
+        self.assertEqual([], data['books'])
+        self.assertEqual([{'id': self.book_2.id, 'label': 'Luciano Ramalho'}], data['authors'])
+
+    def test_limit_and_empty(self):
+        self.assertEqual(2, len(self.autocomplete(q='p', limit=2)['books']))
+        self.assertEqual(3, len(self.autocomplete(q='p', limit='x')['books']))
+        self.assertEqual({'books': [], 'authors': []}, self.autocomplete(q=' '))
+        self.assertEqual({'books': [], 'authors': []}, self.autocomplete(q='100%'))
+
+    def test_follows_writes(self):
+        self.autocomplete(q='tol')
+        self.book_1.author_name = 'Leo Tolstoy'
+        self.book_1.save()
+        self.assertEqual([{'id': self.book_1.id, 'label': 'Leo Tolstoy'}], self.autocomplete(q='tol')['authors'])
+
+
+class BooksRelationBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.user2 = User.objects.create(username='test_username2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=45, author_name='Author 5', owner=self.user)
+        self.book_3 = Book.objects.create(name='Test book 3', price=55, author_name='Author 3', owner=self.user)
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=2, comments='old')
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        self.url = reverse('userbookrelation-bulk')
+
+    def post(self, data):
+        self.client.force_authenticate(self.user)
+        return self.client.post(self.url, data=json.dumps(data), content_type='application/json')
+
+    def test_upsert(self):
+        response = self.post([{'book': self.book_1.id, 'rate': 5},
+                              {'book': self.book_2.id, 'like': True, 'in_bookmarks': True},
+                              {'book': self.book_3.id, 'rate': 3}])
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        self.assertEqual({'created': 2, 'updated': 1, 'errors': []}, response.data)
+
         relation = UserBookRelation.objects.get(user=self.user, book=self.book_1)
-        self.assertFalse(relation.rate)
+        # omitted fields keep their stored values
+        self.assertEqual((True, 5, 'old'), (relation.like, relation.rate, relation.comments))
+        relation = UserBookRelation.objects.get(user=self.user, book=self.book_2)
+        self.assertEqual((True, True, None), (relation.like, relation.in_bookmarks, relation.rate))
+        self.assertEqual(4, UserBookRelation.objects.count())
+
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.book_3.refresh_from_db()
+        self.assertEqual(('4.50', 1), (str(self.book_1.rating), self.book_1.likes_count))
+        self.assertEqual((None, 1), (self.book_2.rating, self.book_2.likes_count))
+        self.assertEqual('3.00', str(self.book_3.rating))
+
+    def test_errors_per_item(self):
+        response = self.post([{'book': self.book_2.id, 'rate': 6},
+                              {'book': self.book_3.id, 'like': True},
+                              {'book': 0},
+                              {'like': True},
+                              'book'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        self.assertEqual({'created': 1, 'updated': 0}, {key: response.data[key] for key in ('created', 'updated')})
+        self.assertEqual([0, 2, 3, 4], [error['index'] for error in response.data['errors']])
+        self.assertIn('rate', response.data['errors'][0]['errors'])
+        self.assertEqual({'book': ['Invalid pk "0" - object does not exist.']}, response.data['errors'][1]['errors'])
+        self.assertEqual(['book'], list(response.data['errors'][2]['errors']))
+        self.assertFalse(UserBookRelation.objects.filter(user=self.user, book=self.book_2).exists())
+
+        response = self.post([{'book': 0}])
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(1, len(response.data['errors']))
+
+    def test_batch_shape(self):
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.post({'book': self.book_1.id}).status_code)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.post([]).status_code)
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, data='[]', content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_queries_dont_grow(self):
+        def count(books):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post([{'book': book.id, 'like': True, 'rate': 3} for book in books])
+            self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+            return len(queries)
+
+        books = [Book.objects.create(name=f'Book {i}', price=10, author_name='A', owner=self.user) for i in range(10)]
+        # the second batch updates the first two books and creates the others, still with the same statements
+        self.assertEqual(count(books[:2]), count(books))
+
+
+class BooksBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.user2 = User.objects.create(username='test_username2')
+        self.book_1 = create_book(name='Test book 1', price=25, author_name='Author 1', owner=self.user, discount=False)
+        self.book_2 = create_book(name='Test book 2', price=45, author_name='Author 2', owner=self.user, discount=False)
+        self.book_3 = create_book(name='Test book 3', price=55, author_name='Author 3', owner=self.user2,
+                                  discount=False)
+        self.url = reverse('book-bulk')
+
+    def send(self, method, data, user=None):
+        self.client.force_authenticate(user or self.user)
+        return getattr(self.client, method)(self.url, data=json.dumps(data), content_type='application/json')
+
+    def test_create(self):
+        data = [{'name': f'Bulk book {i}', 'price': 10 + i, 'author_name': 'Bulk Author'} for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.send('post', data)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, response.data)
+        self.assertLess(len(queries), 5)
+        books = Book.objects.filter(pk__in=response.data['ids'])
+        self.assertEqual(50, books.count())
+        self.assertEqual({self.user.id}, set(books.values_list('owner', flat=True)))
+        response = self.client.get(reverse('book-list'), data={'search': 'bulk'})
+        self.assertEqual(50, len(response.data['results']))
+
+    def test_create_errors(self):
+        response = self.send('post', [{'name': 'Ok', 'price': 10, 'author_name': 'A'}, {'name': 'No price'}])
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(['1'], [str(index) for index in response.data])
+        self.assertIn('price', response.data[1])
+        self.assertEqual(3, Book.objects.count())
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.send('post', []).status_code)
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, data='[]', content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_update(self):
+        old = self.client.get(reverse('book-detail', args=(self.book_1.id,)))
+        response = self.send('patch', [{'id': self.book_1.id, 'price': 99}, {'id': self.book_2.id, 'name': 'Renamed'}])
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual(('Test book 1', 99), (self.book_1.name, self.book_1.price))
+        self.assertEqual(('Renamed', 45), (self.book_2.name, self.book_2.price))
+        self.assertEqual(1, self.book_1.version)
+        # cached and conditional responses follow the bulk update
+        response = self.client.get(reverse('book-detail', args=(self.book_1.id,)), HTTP_IF_NONE_MATCH=old['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('99.00', response.data['price'])
+
+        response = self.send('put', [{'id': self.book_1.id, 'price': 1}])
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('name', response.data[0])
+
+    def test_ownership(self):
+        response = self.send('patch', [{'id': self.book_1.id, 'price': 1}, {'id': self.book_3.id, 'price': 1}])
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.book_1.refresh_from_db()
+        self.assertEqual(25, self.book_1.price)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.send('delete', [self.book_3.id]).status_code)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(status.HTTP_200_OK, self.send('patch', [{'id': self.book_3.id, 'price': 1}]).status_code)
+
+    def test_wrong_ids(self):
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.send('delete', [self.book_1.id, 0]).status_code)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.send('delete', [self.book_1.id, self.book_1.id]).status_code)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.send('patch', [{'price': 1}]).status_code)
+        self.assertEqual(3, Book.objects.count())
+
+    def test_delete(self):
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, like=True)
+        response = self.send('delete', [self.book_1.id, self.book_2.id])
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual([self.book_3.id], list(Book.objects.values_list('id', flat=True)))
+        self.assertEqual(0, UserBookRelation.objects.count())
+
+    def test_delete_queries(self):
+        # relations deleted with their book neither update counters nor invalidate it one by one
+        readers = User.objects.bulk_create([User(username=f'reader {i}') for i in range(20)])
+        UserBookRelation.objects.bulk_create([UserBookRelation(user=reader, book=self.book_1, like=True, rate=3)
+                                              for reader in readers])
+        UserBookRelation.objects.create(user=self.user2, book=self.book_2, like=True)
+        self.assertEqual(3, len(self.client.get(reverse('book-list')).data['results']))
+
+        counts = []
+        for book in self.book_1, self.book_2:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.send('delete', [book.id])
+            self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[0])
+        # the cached list follows the deletes
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual([self.book_3.id], [book['id'] for book in response.data['results']])
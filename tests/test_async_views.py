@@ -0,0 +1,100 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from store.models import Book, UserBookRelation
+
+
+class AsyncBooksApiTestCase(TestCase):
+    # every response is compared with the one of the synchronous route it stands in for
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.user2 = User.objects.create(username='test_username2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=250, author_name='Author A', owner=self.user,
+                                          discount=True)
+        self.book_2 = Book.objects.create(name='Test book 2', price=450, author_name='Author B', owner=self.user)
+        self.book_3 = Book.objects.create(name='Test book 3', price=350, author_name='Author C', owner=self.user2)
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, in_bookmarks=True, rate=5)
+
+    async def get(self, url, **params):
+        response = await self.async_client.get(url, params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return json.loads(response.content)
+
+    async def get_sync(self, url, **params):
+        response = await sync_to_async(self.client.get)(url, params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return json.loads(response.content)
+
+    async def test_list(self):
+        response = await self.async_client.get(reverse('async-book-list'))
+        self.assertEqual('application/json', response['Content-Type'])
+        # books and readers, like the synchronous list
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertEqual(await self.get_sync(reverse('book-list')), json.loads(response.content))
+
+    async def test_list_pages(self):
+        params = {'ordering': '-price', 'page_size': 2, 'price': 250}
+        self.assertEqual(await self.get_sync(reverse('book-list'), **params),
+                         await self.get(reverse('async-book-list'), **params))
+
+        data = await self.get(reverse('async-book-list'), ordering='-price', page_size=2)
+        self.assertEqual([self.book_2.id, self.book_3.id], [book['id'] for book in data['results']])
+        data = await self.get(data['next'])
+        self.assertEqual([self.book_1.id], [book['id'] for book in data['results']])
+        self.assertIsNone(data['next'])
+
+    async def test_my_relation(self):
+        await self.async_client.aforce_login(self.user)
+        await sync_to_async(self.client.force_login)(self.user)
+        data = await self.get(reverse('async-book-list'))
+        self.assertEqual((True, False, 4), (data['results'][0]['my_like'], data['results'][0]['my_bookmark'],
+                                            data['results'][0]['my_rate']))
+        self.assertEqual(await self.get_sync(reverse('book-list')), data)
+
+    async def test_detail(self):
+        url = reverse('async-book-detail', args=(self.book_1.id,))
+        self.assertEqual(await self.get_sync(reverse('book-detail', args=(self.book_1.id,))), await self.get(url))
+
+        response = await self.async_client.get(reverse('async-book-detail', args=(self.book_3.id + 1,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertEqual({'detail': 'Not found.'}, json.loads(response.content))
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.delete(reverse('async-book-detail', args=(self.book_1.id,)))
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+        self.assertEqual({'detail': 'Method "DELETE" not allowed.'}, json.loads(response.content))
+
+    async def test_relation(self):
+        url = reverse('async-userbookrelation-detail', args=(self.book_2.id,))
+        response = await self.async_client.patch(url, json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        await self.async_client.aforce_login(self.user2)
+        response = await self.async_client.patch(url, json.dumps({'like': True, 'rate': 3}),
+                                                 content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'book': self.book_2.id, 'like': True, 'in_bookmarks': False, 'rate': 3, 'comments': ''},
+                         json.loads(response.content))
+        relation = await UserBookRelation.objects.aget(user=self.user2, book=self.book_2)
+        self.assertEqual((True, 3), (relation.like, relation.rate))
+
+        # counters of both books are kept up to date
+        url = reverse('async-userbookrelation-detail', args=(self.book_1.id,))
+        response = await self.async_client.patch(url, json.dumps({'rate': 2}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        book_1 = await Book.objects.aget(pk=self.book_1.pk)
+        book_2 = await Book.objects.aget(pk=self.book_2.pk)
+        self.assertEqual((1, '3.00'), (book_1.likes_count, f'{book_1.rating:.2f}'))
+        self.assertEqual((1, '3.00'), (book_2.likes_count, f'{book_2.rating:.2f}'))
+
+        response = await self.async_client.patch(url, json.dumps({'rate': 6}), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual({'rate': ['"6" is not a valid choice.']}, json.loads(response.content))
@@ -0,0 +1,106 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from store.logic import inconsistent_books
+from store.models import Book, UserBookRelation
+from store.seeding import delete_seeded, seed
+
+
+class SeedingTestCase(TestCase):
+    def test_seed(self):
+        dataset = seed(users=20, books=30, relations=5, seed=1)
+        self.assertEqual((20, 30), (len(dataset['users']), len(dataset['books'])))
+        self.assertEqual(100, UserBookRelation.objects.count())
+        book = Book.objects.filter(rating_count__gt=0).first()
+        self.assertEqual(UserBookRelation.objects.filter(book=book, rate__isnull=False).count(), book.rating_count)
+
+        rows = list(Book.objects.order_by('pk').values_list('name', 'price', 'likes_count'))
+        delete_seeded()
+        self.assertFalse(User.objects.exists() or Book.objects.exists() or UserBookRelation.objects.exists())
+        seed(users=20, books=30, relations=5, seed=1)
+        # the same seed gives the same dataset
+        self.assertEqual(rows, list(Book.objects.order_by('pk').values_list('name', 'price', 'likes_count')))
+
+    def test_keeps_other_data(self):
+        user = User.objects.create(username='test_username')
+        book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=user)
+        dataset = seed(users=5, books=5, relations=2)
+        # relations across the two sets go away with the seeded side, the other book is counted again
+        UserBookRelation.objects.create(user_id=dataset['users'][0], book=book, like=True, rate=5)
+        UserBookRelation.objects.create(user=user, book_id=dataset['books'][0], like=True)
+        UserBookRelation.objects.create(user=user, book=book, rate=3)
+        owned = Book.objects.create(name='Test book 2', price=25, author_name='Author 1', owner_id=dataset['users'][0])
+        delete_seeded()
+        self.assertEqual([user], list(User.objects.all()))
+        self.assertEqual([book, owned], list(Book.objects.order_by('pk')))
+        owned.refresh_from_db()
+        self.assertIsNone(owned.owner_id)
+        book.refresh_from_db()
+        self.assertEqual((0, 3, 1, '3.00'), (book.likes_count, book.rating_sum, book.rating_count,
+                                             f'{book.rating:.2f}'))
+        self.assertFalse(inconsistent_books().exists())
+
+
+class SeedDataTestCase(TestCase):
+    def test_seed_data(self):
+        call_command('seed_data', users=30, books=20, relations=4, chunk_size=7, batch_size=10, stdout=StringIO())
+        self.assertEqual((30, 20, 120), (User.objects.count(), Book.objects.count(), UserBookRelation.objects.count()))
+        # relations were inserted without hooks, the counters are rebuilt once at the end
+        self.assertFalse(inconsistent_books().exists())
+        self.assertTrue(Book.objects.filter(likes_count__gt=0, rating__isnull=False).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('seed_data', users=3, books=3, stdout=StringIO())
+        call_command('seed_data', users=3, books=3, relations=1, flush=True, stdout=StringIO())
+        self.assertEqual((3, 3, 3), (User.objects.count(), Book.objects.count(), UserBookRelation.objects.count()))
+        call_command('seed_data', delete=True, stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+
+class BenchApiTestCase(TestCase):
+    def test_report(self):
+        out = StringIO()
+        call_command('bench_api', users=5, books=10, relations=3, requests=4, warmup=1, concurrency=[1],
+                     no_response_cache=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual({'users': 5, 'books': 10, 'relations': 3, 'seed': 0, 'page_size': 100}, report['dataset'])
+        self.assertEqual(['list', 'detail', 'search', 'relation'],
+                         [result['scenario'] for result in report['results']])
+        for result in report['results']:
+            self.assertEqual((4, 0), (result['requests'], result['errors']))
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries_per_request'], 0)
+        # the dataset is dropped after the run
+        self.assertFalse(Book.objects.exists())
+
+    def test_other_database(self):
+        # outside a test run the database has to be named, and never with DEBUG off
+        Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        with mock.patch.object(connection.creation, '_get_test_db_name', return_value='other'):
+            for debug, database in (False, str(connection.settings_dict['NAME'])), (True, None), (True, 'other'):
+                with self.subTest(debug=debug, database=database), override_settings(DEBUG=debug):
+                    with self.assertRaises(CommandError):
+                        call_command('bench_api', database=database, stdout=StringIO())
+        self.assertTrue(Book.objects.exists())
+
+
+class BenchRelationsTestCase(TestCase):
+    def test_report(self):
+        out = StringIO()
+        call_command('bench_relations', users=10, books=20, relations=3, calls=5, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(['set_rating', 'my_relation', 'get_or_create', 'upsert'],
+                         [result['operation'] for result in report['results']])
+        self.assertEqual(5, report['results'][0]['calls'])
+        self.assertGreaterEqual(report['relation_rows'], 30)
+        for result in report['results'][0], *report['results'][2:]:
+            # the book is known up front, so never more than one partition per statement
+            self.assertTrue(all(scanned <= 1 for scanned in result['partitions_scanned']), result)
+        self.assertFalse(Book.objects.exists())
@@ -0,0 +1,112 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.cache import cache_stats
+from store.checks import shared_cache_check
+from store.models import Book, UserBookRelation
+
+
+class BooksCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.reader = User.objects.create(username='reader', first_name='Petr', last_name='Ivanov')
+        self.book_1 = Book.objects.create(name='Test book 1', price=250, author_name='Author A', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=450, author_name='Author B', owner=self.user)
+        UserBookRelation.objects.create(user=self.reader, book=self.book_1, rate=4)
+        self.list_url = reverse('book-list')
+        self.detail_url = reverse('book-detail', args=(self.book_1.id,))
+
+    def get(self, url, **params):
+        response = self.client.get(url, data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data['results'][0] if 'results' in response.data else response.data
+
+    def patch_relation(self, user, book, data):
+        self.client.force_login(user)
+        url = reverse('userbookrelation-detail', args=(book.id,))
+        response = self.client.patch(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.client.logout()
+
+    def test_hit(self):
+        self.get(self.list_url)
+        with CaptureQueriesContext(connection) as queries:
+            self.get(self.list_url)
+            self.get(self.list_url, ordering='price')
+            self.get(self.list_url)
+        self.assertEqual(2, len(queries))
+        self.assertEqual({'hits': 2, 'misses': 2}, cache_stats())
+
+    def test_params_in_key(self):
+        self.assertEqual(self.book_1.id, self.get(self.list_url)['id'])
+        self.assertEqual(self.book_2.id, self.get(self.list_url, ordering='-price')['id'])
+        self.assertEqual(self.book_2.id, self.get(self.list_url, search='book 2')['id'])
+        self.assertEqual(self.book_2.id, self.get(self.list_url, price='450')['id'])
+        self.assertEqual({'hits': 0, 'misses': 4}, cache_stats())
+
+    def test_like_and_rate(self):
+        self.assertEqual(0, self.get(self.list_url)['annotated_likes'])
+        self.get(self.detail_url)
+        self.patch_relation(self.user, self.book_1, {'like': True, 'rate': 2})
+        self.assertEqual(1, self.get(self.list_url)['annotated_likes'])
+        self.assertEqual('3.00', self.get(self.detail_url)['rating'])
+        self.assertEqual(2, len(self.get(self.detail_url)['readers']))
+
+    def test_book_update_and_delete(self):
+        self.get(self.detail_url)
+        self.get(self.list_url)
+        self.book_1.price = 100
+        self.book_1.save()
+        self.assertEqual('100.00', self.get(self.detail_url)['price'])
+        self.assertEqual('100.00', self.get(self.list_url)['price'])
+        self.book_1.delete()
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(self.detail_url).status_code)
+        self.assertEqual(self.book_2.id, self.get(self.list_url)['id'])
+
+    def test_users(self):
+        self.get(self.detail_url)
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual('renamed', self.get(self.detail_url)['owner_name'])
+        self.reader.first_name = 'Semen'
+        self.reader.save()
+        self.assertEqual([{'first_name': 'Semen', 'last_name': 'Ivanov'}], self.get(self.detail_url)['readers'])
+        self.reader.delete()
+        self.assertEqual([], self.get(self.detail_url)['readers'])
+        self.user.delete()
+        self.assertIsNone(self.get(self.detail_url)['owner_name'])
+
+    def test_bulk_relations(self):
+        self.get(self.list_url)
+        UserBookRelation.objects.bulk_create([UserBookRelation(user=self.user, book=self.book_1, like=True)])
+        self.assertEqual(1, self.get(self.list_url)['annotated_likes'])
+        UserBookRelation.objects.filter(book=self.book_1).update(like=False)
+        self.assertEqual(0, self.get(self.list_url)['annotated_likes'])
+
+    def test_detail_is_precise(self):
+        self.get(self.detail_url)
+        self.book_2.name = 'Other'
+        self.book_2.save()
+        self.get(self.detail_url)
+        self.assertEqual({'hits': 1, 'misses': 1}, cache_stats())
+
+
+class SharedCacheCheckTestCase(SimpleTestCase):
+    def test_process_local_cache(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local, DEBUG=False):
+            self.assertEqual(['store.E001'], [error.id for error in shared_cache_check(None)])
+        with override_settings(CACHES=local, DEBUG=True):
+            self.assertEqual(['store.W001'], [error.id for error in shared_cache_check(None)])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache'}}
+        with override_settings(CACHES=shared, DEBUG=False):
+            self.assertEqual([], shared_cache_check(None))
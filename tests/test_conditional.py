@@ -0,0 +1,126 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.models import Book, UserBookRelation
+
+
+class BooksConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book_1 = Book.objects.create(name='Test book 1', price=250, author_name='Author A', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=450, author_name='Author B', owner=self.user)
+        self.list_url = reverse('book-list')
+        self.detail_url = reverse('book-detail', args=(self.book_1.id,))
+
+    def etag(self, url, **params):
+        response = self.client.get(url, data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response['ETag']
+
+    def assertNotModified(self, url, etag, queries_count, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data=params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(queries_count, len(queries))
+        self.assertEqual(etag, response['ETag'])
+
+    def test_detail(self):
+        etag = self.etag(self.detail_url)
+        self.assertNotModified(self.detail_url, etag, 1)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(etag, response['ETag'])
+
+    def test_cached_not_modified(self):
+        etag = self.etag(self.detail_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(0, len(queries))
+
+    def test_detail_changes(self):
+        etags = [self.etag(self.detail_url)]
+        self.book_1.price = 300
+        self.book_1.save()
+        etags.append(self.etag(self.detail_url))
+        # new reader without like or rate
+        relation = UserBookRelation.objects.create(user=self.user, book=self.book_1)
+        etags.append(self.etag(self.detail_url))
+        relation.like = True
+        relation.save()
+        etags.append(self.etag(self.detail_url))
+        relation.rate = 4
+        relation.save()
+        etags.append(self.etag(self.detail_url))
+        self.user.username = 'renamed'
+        self.user.save()
+        etags.append(self.etag(self.detail_url))
+        relation.delete()
+        etags.append(self.etag(self.detail_url))
+        self.assertEqual(len(etags), len(set(etags)))
+
+        relation = UserBookRelation.objects.create(user=self.user, book=self.book_2)
+        relation.comments = 'Not a part of the book'
+        relation.save()
+        self.assertEqual(etags[-1], self.etag(self.detail_url))
+
+    def test_version(self):
+        stale = Book.objects.get(pk=self.book_1.pk)
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(2, stale.version)
+        self.book_1.refresh_from_db()
+        self.assertEqual((2, 1), (self.book_1.version, self.book_1.likes_count))
+
+    def test_if_modified_since(self):
+        Book.objects.filter(pk=self.book_1.pk).update(modified_at=timezone.now() - timedelta(seconds=10))
+        cache.clear()
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        cache.clear()
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+        # a later change always ends a later second than the date the client has
+        self.book_1.name = 'Changed'
+        self.book_1.save()
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('Changed', response.data['name'])
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_list(self):
+        etag = self.etag(self.list_url)
+        self.assertNotModified(self.list_url, etag, 1)
+        self.assertNotEqual(etag, self.etag(self.list_url, ordering='-price'))
+
+        self.client.force_login(self.user)
+        url = reverse('userbookrelation-detail', args=(self.book_2.id,))
+        self.client.patch(url, data=json.dumps({'rate': 5}), content_type='application/json')
+        self.assertNotEqual(etag, self.etag(self.list_url))
+
+    def test_list_page(self):
+        etag = self.etag(self.list_url, page_size=1)
+        self.book_2.name = 'Changed outside the page'
+        self.book_2.save()
+        self.assertNotModified(self.list_url, etag, 1, page_size=1)
+        self.book_2.delete()
+        # the next link disappears
+        self.assertNotEqual(etag, self.etag(self.list_url, page_size=1))
+
+    def test_missing(self):
+        url = reverse('book-detail', args=(self.book_2.id + 100,))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"any"')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
@@ -0,0 +1,71 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.instrumentation import reset_metrics
+from store.models import Book
+
+
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        self.user = User.objects.create(username='test_username')
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=45, author_name='Author 2', owner=self.user)
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(['db', 'serialize', 'render', 'total'], list(timing))
+        self.assertIn('desc="2 queries"', timing['db'])
+
+        response = self.client.get(reverse('book-list'))
+        # served from the response cache, no SQL at all
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+
+    def test_metrics(self):
+        self.client.get(reverse('book-list'))
+        self.client.get(reverse('book-detail', args=(self.book_1.id,)))
+        self.client.get(reverse('book-detail', args=(self.book_2.id,)))
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get(reverse('metrics')).status_code)
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        detail = response.data['book-detail']
+        self.assertEqual(2, detail['count'])
+        self.assertEqual(4, detail['queries'])
+        self.assertEqual(2, detail['max_queries'])
+        self.assertEqual(2, sum(detail['buckets'].values()))
+        self.assertEqual(1, response.data['book-list']['count'])
+        # the forbidden request is measured too, the current one is recorded after the response
+        self.assertEqual(1, response.data['metrics']['count'])
+
+    @override_settings(QUERY_BUDGETS={'book-list': 1})
+    def test_budget(self):
+        with self.assertLogs('store.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('book-list'))
+        self.assertEqual(['Query budget exceeded for GET book-list: 2 queries, budget 1'],
+                         [record.getMessage() for record in logs.records])
+        with self.assertNoLogs('store.instrumentation', 'WARNING'):
+            self.client.get(reverse('book-detail', args=(self.book_1.id,)))
+
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(1, self.client.get(reverse('metrics')).data['book-list']['budget_breaches'])
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_disabled(self):
+        response = self.client.patch(reverse('userbookrelation-detail', args=(self.book_1.id,)),
+                                     data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertNotIn('Server-Timing', response)
@@ -0,0 +1,110 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from store.listing import listing_stats, refresh_listings
+from store.models import Book, BookListing, UserBookRelation
+
+
+@override_settings(BOOK_LISTING=True)
+class BookListingTestCase(APITransactionTestCase):
+    # transactions really commit here, so the on-commit refreshes of store.signals run
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.reader = User.objects.create(username='reader', first_name='Petr', last_name='Ivanov')
+        self.book_1 = Book.objects.create(name='Test book 1', price=250, author_name='Author A', owner=self.user,
+                                          discount=True)
+        self.book_2 = Book.objects.create(name='Test book 2', price=450, author_name='Author B', owner=self.user)
+        UserBookRelation.objects.create(user=self.reader, book=self.book_1, like=True, rate=4)
+
+    def listing(self, book):
+        return BookListing.objects.values('name', 'price_w_discount', 'likes_count', 'rating', 'owner_name',
+                                          'version').get(pk=book.pk)
+
+    def get_both(self, url_name, *args, **params):
+        # the same response with and without the read model
+        response = self.client.get(reverse(url_name, args=args), params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        cache.clear()
+        with override_settings(BOOK_LISTING=False):
+            self.assertEqual(self.client.get(reverse(url_name, args=args), params).data, response.data)
+        return response.data
+
+    def test_refreshed_on_writes(self):
+        listing = self.listing(self.book_1)
+        self.assertEqual(('150.00', 1, '4.00', 'test_username'),
+                         (f'{listing["price_w_discount"]:.2f}', listing['likes_count'], f'{listing["rating"]:.2f}',
+                          listing['owner_name']))
+
+        self.client.force_login(self.user)
+        url = reverse('userbookrelation-detail', args=(self.book_1.id,))
+        response = self.client.patch(url, json.dumps({'like': True, 'rate': 2}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual((2, '3.00'), (self.listing(self.book_1)['likes_count'],
+                                       f'{self.listing(self.book_1)["rating"]:.2f}'))
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual('renamed', self.listing(self.book_2)['owner_name'])
+
+        self.book_2.name = 'Renamed book'
+        self.book_2.save()
+        self.assertEqual('Renamed book', self.listing(self.book_2)['name'])
+        self.book_2.delete()
+        self.assertFalse(BookListing.objects.filter(pk=self.book_2.pk).exists())
+
+        self.reader.delete()
+        self.assertEqual(1, self.listing(self.book_1)['likes_count'])
+        self.assertEqual({'rows': 1, 'stale': 0, 'orphaned': 0, 'lag': 0.0}, listing_stats())
+
+    def test_api(self):
+        self.get_both('book-list')
+        self.get_both('book-list', ordering='-price', price=450)
+        self.get_both('book-detail', self.book_1.id)
+        self.client.force_login(self.reader)
+        data = self.get_both('book-list')
+        self.assertEqual((True, False, 4), (data['results'][0]['my_like'], data['results'][0]['my_bookmark'],
+                                            data['results'][0]['my_rate']))
+
+        # the next page and search still work
+        data = self.get_both('book-list', page_size=1)
+        self.assertEqual([self.book_2.id], [book['id'] for book in self.client.get(data['next']).data['results']])
+        data = self.get_both('book-list', search='book 2')
+        self.assertEqual([self.book_2.id], [book['id'] for book in data['results']])
+
+    def test_lag_and_rebuild(self):
+        with override_settings(BOOK_LISTING=False):
+            self.book_1.name = 'Changed'
+            self.book_1.save()
+        orphan = {**BookListing.objects.values().get(pk=self.book_2.pk), 'id': self.book_2.pk + 1}
+        BookListing.objects.create(**orphan)
+        stats = listing_stats()
+        self.assertEqual((3, 1, 1), (stats['rows'], stats['stale'], stats['orphaned']))
+        self.assertGreater(stats['lag'], 0)
+
+        # rows of missing books are removed by an incremental refresh too
+        refresh_listings([orphan['id']])
+        self.assertEqual(0, listing_stats()['orphaned'])
+
+        out = StringIO()
+        call_command('rebuild_listings', stdout=out)
+        self.assertIn('Rebuilt listings for 2 books, 0 stale', out.getvalue())
+        self.assertEqual({'rows': 2, 'stale': 0, 'orphaned': 0, 'lag': 0.0}, listing_stats())
+        self.assertEqual('Changed', self.listing(self.book_1)['name'])
+
+    def test_stats_api(self):
+        url = reverse('metrics-listings')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get(url).status_code)
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, response.data['rows'])
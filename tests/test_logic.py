@@ -1,7 +1,15 @@
+import threading
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from store.logic import set_rating
-from store.models import Book, UserBookRelation
+from store.logic import set_rating, flush_dirty_ratings, inconsistent_books, rating_queue_stats, upsert_relation
+from store.models import Book, UserBookRelation, DirtyBookRating
 
 from django.test import TestCase
 
@@ -23,3 +31,255 @@ class SetRatingTestCase(TestCase):
         set_rating(self.book_1)
         self.book_1.refresh_from_db()
         self.assertEqual('4.67', str(self.book_1.rating))
+
+
+class UpdateRatingTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=125, author_name='Author 1', owner=self.user1)
+
+    def assertRating(self, rating, rating_sum, rating_count):
+        self.book_1.refresh_from_db()
+        self.assertEqual(rating, None if self.book_1.rating is None else str(self.book_1.rating))
+        self.assertEqual(rating_sum, self.book_1.rating_sum)
+        self.assertEqual(rating_count, self.book_1.rating_count)
+
+    def test_add(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        self.assertRating('4.50', 9, 2)
+
+    def test_change(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        relation.rate = 1
+        relation.save()
+        self.assertRating('2.50', 5, 2)
+        relation.save()
+        self.assertRating('2.50', 5, 2)
+
+    def test_clear(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        relation.rate = None
+        relation.save()
+        self.assertRating('4.00', 4, 1)
+
+    def test_clear_last(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        relation.rate = None
+        relation.save()
+        self.assertRating(None, 0, 0)
+
+    def test_like_only(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        self.assertRating(None, 0, 0)
+        relation.rate = 3
+        relation.save()
+        self.assertRating('3.00', 3, 1)
+
+    def test_delete(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=2)
+        self.user1.delete()
+        self.assertRating('2.00', 2, 1)
+
+    def test_rebuild_command(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        Book.objects.update(rating=None, rating_sum=0, rating_count=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertRating('4.50', 9, 2)
+
+
+@override_settings(RATING_UPDATE_MODE='deferred')
+class DeferredRatingTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.book_1 = Book.objects.create(name='Test book 1', price=125, author_name='Author 1')
+        self.book_2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 2')
+
+    def rate(self, user, book, rate):
+        with self.captureOnCommitCallbacks(execute=True):
+            relation, _ = UserBookRelation.objects.get_or_create(user=user, book=book)
+            relation.rate = rate
+            relation.save()
+
+    def test_coalesced(self):
+        for user in self.users:
+            self.rate(user, self.book_1, 5)
+        self.rate(self.users[0], self.book_1, 2)
+        self.rate(self.users[0], self.book_2, 3)
+
+        self.book_1.refresh_from_db()
+        self.assertIsNone(self.book_1.rating)
+        self.assertEqual(2, rating_queue_stats()['depth'])
+
+        self.assertEqual(2, flush_dirty_ratings())
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual('4.00', str(self.book_1.rating))
+        self.assertEqual((12, 3), (self.book_1.rating_sum, self.book_1.rating_count))
+        self.assertEqual('3.00', str(self.book_2.rating))
+        self.assertEqual({'depth': 0, 'lag': 0.0}, rating_queue_stats())
+
+    def test_marked_after_flush(self):
+        self.rate(self.users[0], self.book_1, 5)
+        flush_dirty_ratings()
+        self.rate(self.users[1], self.book_1, 4)
+        self.assertEqual(1, DirtyBookRating.objects.count())
+        self.assertGreaterEqual(rating_queue_stats()['lag'], 0.0)
+
+        call_command('rating_worker', once=True, stdout=StringIO())
+        self.book_1.refresh_from_db()
+        self.assertEqual('4.50', str(self.book_1.rating))
+        self.assertFalse(DirtyBookRating.objects.exists())
+
+    def test_deleted_book(self):
+        self.rate(self.users[0], self.book_1, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book_1.delete()
+        self.assertEqual(1, flush_dirty_ratings())
+
+
+class LikesCountTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.book_1 = Book.objects.create(name='Test book 1', price=125, author_name='Author 1')
+        self.book_2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 2')
+
+    def assertLikes(self, book_1, book_2):
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual((book_1, book_2), (self.book_1.likes_count, self.book_2.likes_count))
+
+    def test_save(self):
+        relation = UserBookRelation.objects.create(user=self.users[0], book=self.book_1, like=True)
+        UserBookRelation.objects.create(user=self.users[1], book=self.book_1)
+        self.assertLikes(1, 0)
+        relation.like = False
+        relation.save()
+        self.assertLikes(0, 0)
+        relation.like = True
+        relation.book = self.book_2
+        relation.save()
+        self.assertLikes(0, 1)
+
+    def test_delete(self):
+        UserBookRelation.objects.create(user=self.users[0], book=self.book_1, like=True)
+        UserBookRelation.objects.create(user=self.users[1], book=self.book_1, like=True)
+        UserBookRelation.objects.filter(user=self.users[0]).delete()
+        self.assertLikes(1, 0)
+
+    def test_bulk(self):
+        UserBookRelation.objects.bulk_create([
+            UserBookRelation(user=user, book=book, like=True, rate=4) for user in self.users
+            for book in (self.book_1, self.book_2)
+        ])
+        self.assertLikes(3, 3)
+        self.assertEqual('4.00', str(self.book_1.rating))
+
+        UserBookRelation.objects.filter(book=self.book_1, user__in=self.users[:2]).update(like=False)
+        self.assertLikes(1, 3)
+
+        relations = list(UserBookRelation.objects.filter(book=self.book_2))
+        for relation in relations:
+            relation.like = False
+            relation.rate = 2
+        UserBookRelation.objects.bulk_update(relations, ['like', 'rate'])
+        self.assertLikes(1, 0)
+        self.assertEqual('2.00', str(self.book_2.rating))
+
+    def test_check_counters(self):
+        UserBookRelation.objects.create(user=self.users[0], book=self.book_1, like=True, rate=3)
+        out = StringIO()
+        call_command('check_counters', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+        Book.objects.filter(pk=self.book_1.pk).update(likes_count=10)
+        out = StringIO()
+        call_command('check_counters', stdout=out)
+        self.assertIn(f'1 books with inconsistent counters: {self.book_1.pk}', out.getvalue())
+        self.assertLikes(10, 0)
+
+        call_command('check_counters', repair=True, stdout=StringIO())
+        self.assertLikes(1, 0)
+
+        Book.objects.filter(pk=self.book_1.pk).update(rating=5)
+        self.assertEqual([self.book_1.pk], list(inconsistent_books().values_list('pk', flat=True)))
+        call_command('check_counters', repair=True, stdout=StringIO())
+        self.book_1.refresh_from_db()
+        self.assertEqual('3.00', str(self.book_1.rating))
+        self.assertFalse(inconsistent_books().exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'the single statement upsert is PostgreSQL only')
+class UpsertRelationTestCase(TransactionTestCase):
+    # transactions really commit here, so threads with their own connections race for the same rows
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(8)]
+        self.book = Book.objects.create(name='Test book 1', price=125, author_name='Author 1', owner=self.users[0])
+
+    def run_threads(self, calls):
+        # all calls start together, every one in its own thread and transaction
+        barrier = threading.Barrier(len(calls))
+        results, errors = [], []
+
+        def run(call):
+            try:
+                barrier.wait()
+                results.append(call())
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(call,)) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        return results
+
+    def statements(self, queries):
+        return [query['sql'] for query in queries.captured_queries if query['sql'] not in ('BEGIN', 'COMMIT')]
+
+    def test_statements(self):
+        with CaptureQueriesContext(connection) as queries:
+            relation, created = upsert_relation(self.users[1], self.book.pk, {'like': True, 'rate': 4})
+        self.assertEqual((True, True, 4), (created, relation.like, relation.rate))
+        # the upsert and the counters of the book
+        self.assertEqual(2, len(self.statements(queries)))
+
+        with CaptureQueriesContext(connection) as queries:
+            relation, created = upsert_relation(self.users[1], self.book.pk, {'comments': 'Nice'})
+        self.assertEqual((False, True, 4, 'Nice'), (created, relation.like, relation.rate, relation.comments))
+        # nothing counted changed
+        self.assertEqual(1, len(self.statements(queries)))
+
+        with self.assertRaises(Book.DoesNotExist):
+            upsert_relation(self.users[1], self.book.pk + 1, {'like': True})
+
+    def test_same_user(self):
+        user = self.users[1]
+        results = self.run_threads([lambda rate=rate: upsert_relation(user, self.book.pk, {'like': True, 'rate': rate})
+                                    for rate in [1, 2, 3, 4, 5] * 2])
+        self.assertEqual(1, sum(created for _, created in results))
+        relation = UserBookRelation.objects.get()
+        self.book.refresh_from_db()
+        self.assertEqual((1, 1, relation.rate), (self.book.likes_count, self.book.rating_count, self.book.rating_sum))
+
+        # toggled back and forth by racing requests, the counters follow the row
+        self.run_threads([lambda like=like: upsert_relation(user, self.book.pk, {'like': like, 'rate': None})
+                          for like in [True, False] * 5])
+        self.assertFalse(inconsistent_books().exists())
+
+    def test_many_users(self):
+        self.run_threads([lambda user=user: upsert_relation(user, self.book.pk, {'like': True, 'rate': 5})
+                          for user in self.users])
+        self.book.refresh_from_db()
+        self.assertEqual((8, 8, '5.00'), (UserBookRelation.objects.count(), self.book.likes_count,
+                                          f'{self.book.rating:.2f}'))
+        self.assertFalse(inconsistent_books().exists())
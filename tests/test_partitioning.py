@@ -0,0 +1,59 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from store.logic import set_rating
+from store.models import Book, UserBookRelation
+from store.partitioning import relation_partitions, scanned_partitions
+
+
+class PartitionedRelationsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.user2 = User.objects.create(username='test_username2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=250, author_name='Author A', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=450, author_name='Author B', owner=self.user)
+        self.relation = UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=4)
+
+    def statements(self, call):
+        # statements of `call` that read or write the relations
+        with CaptureQueriesContext(connection) as queries:
+            call()
+        return [query['sql'] for query in queries.captured_queries
+                if UserBookRelation._meta.db_table in query['sql'] and not query['sql'].startswith('SAVEPOINT')]
+
+    def test_move_to_other_book(self):
+        # on PostgreSQL the row moves to the partition of the other book
+        self.relation.book = self.book_2
+        self.relation.save()
+        self.relation.like = False
+        self.relation.save()
+        self.assertEqual([(self.book_2.id, False)], list(UserBookRelation.objects.values_list('book_id', 'like')))
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual((0, None, 0, '4.00'), (self.book_1.likes_count, self.book_1.rating, self.book_2.likes_count,
+                                                f'{self.book_2.rating:.2f}'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'hash partitions exist on PostgreSQL only')
+    def test_partitions(self):
+        self.assertEqual(16, len(relation_partitions()))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM store_userbookrelation')
+            self.assertIn(cursor.fetchone()[0], relation_partitions())
+
+    @skipUnless(connection.vendor == 'postgresql', 'hash partitions exist on PostgreSQL only')
+    def test_pruned(self):
+        calls = {
+            'set_rating': lambda: set_rating(self.book_1),
+            'get_or_create': lambda: UserBookRelation.objects.get_or_create(user=self.user, book=self.book_1),
+            'save': lambda: self.relation.save(),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                statements = self.statements(call)
+                self.assertTrue(statements)
+                for sql in statements:
+                    self.assertEqual(1, len(scanned_partitions(sql)), sql)
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.pooling import ConnectionPool, PoolTimeout, close_pool, get_pool, pool_stats
+
+
+def connect():
+    # an in-memory SQLite database stands in for a server connection
+    return sqlite3.connect(':memory:', check_same_thread=False)
+
+
+def check(connection):
+    connection.execute('SELECT 1')
+    return True
+
+
+def reset(connection):
+    connection.rollback()
+    return True
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def make_pool(self, **options):
+        pool = ConnectionPool(**{'max_size': 2, 'timeout': 5, 'check': check, 'reset': reset, **options})
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuse(self):
+        pool = self.make_pool()
+        connection = pool.getconn(connect)
+        pool.putconn(connection)
+        self.assertIs(connection, pool.getconn(connect))
+        self.assertEqual({'size': 1, 'idle': 0, 'in_use': 1, 'utilization': 0.5, 'requests': 2, 'opened': 1,
+                          'closed': 0},
+                         {key: value for key, value in pool.stats().items()
+                          if key in ('size', 'idle', 'in_use', 'utilization', 'requests', 'opened', 'closed')})
+
+    def test_timeout(self):
+        pool = self.make_pool(timeout=0.05)
+        pool.getconn(connect)
+        pool.getconn(connect)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(connect)
+        stats = pool.stats()
+        self.assertEqual((2, 1, 1, 0), (stats['in_use'], stats['waits'], stats['timeouts'], stats['waiting']))
+
+    def test_waiting(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.getconn(connect)
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(pool.getconn(connect)))
+        waiter.start()
+        while not pool.stats()['waiting']:
+            threading.Event().wait(0.001)
+        pool.putconn(connection)
+        waiter.join(5)
+        self.assertEqual([connection], received)
+        self.assertEqual(1, pool.stats()['opened'])
+
+    def test_broken(self):
+        pool = self.make_pool(reset=lambda connection: False)
+        connection = pool.getconn(connect)
+        pool.putconn(connection)
+        self.assertIsNot(connection, pool.getconn(connect))
+        self.assertEqual((1, 2, 1), (pool.stats()['size'], pool.stats()['opened'], pool.stats()['closed']))
+
+    def test_connect_error(self):
+        pool = self.make_pool()
+
+        def fail():
+            raise sqlite3.OperationalError('unable to connect')
+
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.getconn(fail)
+        self.assertEqual((0, 0, 0), (pool.stats()['size'], pool.stats()['opened'], pool.stats()['closed']))
+
+    def test_health_check(self):
+        pool = self.make_pool(check_after=0)
+        connection = pool.getconn(connect)
+        pool.putconn(connection)
+        # the server went away while the connection was idle
+        connection.close()
+        fresh = pool.getconn(connect)
+        self.assertIsNot(connection, fresh)
+        check(fresh)
+        self.assertEqual((1, 1), (pool.stats()['health_check_failures'], pool.stats()['size']))
+
+    def test_lifetime_and_idle(self):
+        pool = self.make_pool(max_lifetime=0)
+        connection = pool.getconn(connect)
+        pool.putconn(connection)
+        self.assertEqual((0, 1), (pool.stats()['size'], pool.stats()['closed']))
+
+        pool = self.make_pool(max_size=3, max_idle=0, min_size=1)
+        connections = [pool.getconn(connect) for _ in range(3)]
+        for connection in connections:
+            pool.putconn(connection)
+        # the most recently returned one is kept for min_size
+        self.assertIs(connections[-1], pool.getconn(connect))
+        self.assertEqual((1, 2), (pool.stats()['size'], pool.stats()['closed']))
+
+    def test_registry(self):
+        self.addCleanup(close_pool, 'test')
+        pool = get_pool('test', 'a', {'max_size': 3})
+        self.assertIs(pool, get_pool('test', 'a', {'max_size': 3}))
+        connection = pool.getconn(connect)
+        self.assertEqual(1, pool_stats()['test']['in_use'])
+
+        # other connection parameters replace the pool, its connections are closed when they come back
+        replaced = get_pool('test', 'b', {'max_size': 3})
+        self.assertIsNot(pool, replaced)
+        pool.putconn(connection)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+        self.assertEqual(0, pool_stats()['test']['size'])
+
+
+class PoolStatsApiTestCase(APITestCase):
+    def test_get(self):
+        url = reverse('metrics-pools')
+        self.client.force_authenticate(User.objects.create(username='test_username'))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get(url).status_code)
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(pool_stats().keys(), response.data.keys())
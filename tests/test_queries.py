@@ -0,0 +1,160 @@
+import json
+from itertools import cycle
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from store.models import Book, UserBookRelation
+from testdrf.urls import router
+from tests.queries import QueryCountAssertionsMixin
+
+
+class RouteQueriesTestCase(QueryCountAssertionsMixin, APITestCase):
+    # every route of the router at 1, 10 and 100 books (and readers of the popular book),
+    # a test named `test_<route name>...` has to exist for each of them
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.readers = [User.objects.create(username=f'reader {i}', first_name=f'First {i}', last_name=f'Last {i}')
+                        for i in range(2)]
+        self.book = Book.objects.create(name='Popular book', price=100, author_name='Author 0', owner=self.user)
+        UserBookRelation.objects.create(user=self.user, book=self.book, rate=1)
+        self.books = []
+        self.client.force_authenticate(self.user)
+
+    def grow(self, size):
+        # `size` books with two readers each and `size` more readers of the popular book
+        start = len(self.books)
+        if size <= start:
+            return
+        books = Book.objects.bulk_create([
+            Book(name=f'Book {i}', price=100 + i % 5, author_name=f'Author {i % 7}', owner=self.user,
+                 discount=i % 2 == 0)
+            for i in range(start, size)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'grown reader {i}', first_name=f'First {i}', last_name=f'Last {i}')
+            for i in range(start, size)
+        ])
+        UserBookRelation.objects.bulk_create(
+            [UserBookRelation(user=reader, book=book, like=True, rate=1 + book.pk % 5)
+             for book in books for reader in self.readers] +
+            [UserBookRelation(user=user, book=self.book, like=user.pk % 2 == 0, rate=1 + user.pk % 5)
+             for user in users]
+        )
+        self.books.extend(books)
+
+    def send(self, method, url, data):
+        return getattr(self.client, method)(url, data=json.dumps(data), content_type='application/json')
+
+    def stream(self, **params):
+        response = self.client.get(reverse('book-stream'), data=params)
+        b''.join(response.streaming_content)
+        return response
+
+    def test_every_route_is_covered(self):
+        tests = [name for name in dir(self) if name.startswith('test_')]
+        for pattern in router.urls:
+            prefix = f'test_{pattern.name.replace("-", "_")}'
+            self.assertTrue(any(test == prefix or test.startswith(f'{prefix}_') for test in tests), pattern.name)
+
+    def test_book_list(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(lambda: self.client.get(url), budget=settings.QUERY_BUDGETS['book-list'])
+
+    def test_book_list_search(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(lambda: self.client.get(url, data={'search': 'book'}))
+
+    def test_book_list_search_ordering(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(lambda: self.client.get(url, data={'search': 'book author', 'ordering': 'price'}))
+
+    def test_book_list_ordering(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(lambda: self.client.get(url, data={'ordering': '-price'}))
+
+    def test_book_list_ordering_author(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(lambda: self.client.get(url, data={'ordering': 'author_name'}))
+
+    def test_book_list_filter(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(lambda: self.client.get(url, data={'price': 100}))
+
+    def test_book_list_create(self):
+        url = reverse('book-list')
+        self.assertQueryCountConstant(
+            lambda: self.send('post', url, {'name': 'New book', 'price': 150, 'author_name': 'New Author'}))
+
+    def test_book_detail(self):
+        url = reverse('book-detail', args=(self.book.id,))
+        self.assertQueryCountConstant(lambda: self.client.get(url), budget=settings.QUERY_BUDGETS['book-detail'])
+
+    def test_book_detail_update(self):
+        url = reverse('book-detail', args=(self.book.id,))
+        prices = cycle([200, 300])
+        self.assertQueryCountConstant(
+            lambda: self.send('put', url, {'name': 'Popular book', 'price': next(prices), 'author_name': 'Author 0'}))
+
+    def test_book_detail_partial_update(self):
+        url = reverse('book-detail', args=(self.book.id,))
+        prices = cycle([200, 300])
+        self.assertQueryCountConstant(lambda: self.send('patch', url, {'price': next(prices)}))
+
+    def test_book_detail_delete(self):
+        # the last grown book, a new one is grown for every size
+        self.assertQueryCountConstant(
+            lambda: self.client.delete(reverse('book-detail', args=(self.books[-1].id,))))
+
+    def test_book_bulk_create(self):
+        url = reverse('book-bulk')
+        self.assertQueryCountConstant(
+            lambda: self.send('post', url, [{'name': 'Bulk book', 'price': 10, 'author_name': 'Bulk Author'}] * 3))
+
+    def test_book_bulk_update(self):
+        url = reverse('book-bulk')
+        self.assertQueryCountConstant(
+            lambda: self.send('patch', url, [{'id': self.book.id, 'price': 20},
+                                             {'id': self.books[-1].id, 'price': 30}]))
+
+    def test_book_bulk_delete(self):
+        url = reverse('book-bulk')
+        self.assertQueryCountConstant(lambda: self.send('delete', url, [self.books[-1].id]))
+
+    def test_book_stream(self):
+        self.assertQueryCountConstant(lambda: self.stream())
+
+    def test_book_stream_ndjson(self):
+        self.assertQueryCountConstant(lambda: self.stream(stream_format='ndjson', search='book', ordering='price'))
+
+    def test_book_autocomplete(self):
+        url = reverse('book-autocomplete')
+        self.assertQueryCountConstant(lambda: self.client.get(url, data={'q': 'boo'}),
+                                      budget=settings.QUERY_BUDGETS['book-autocomplete'])
+
+    def test_userbookrelation_detail_like(self):
+        url = reverse('userbookrelation-detail', args=(self.book.id,))
+        likes = cycle([True, False])
+        self.assertQueryCountConstant(lambda: self.send('patch', url, {'like': next(likes)}))
+
+    def test_userbookrelation_detail_rate(self):
+        # the rating counters path, every rate differs from the stored one
+        url = reverse('userbookrelation-detail', args=(self.book.id,))
+        rates = cycle([2, 3, 4])
+        self.assertQueryCountConstant(lambda: self.send('patch', url, {'rate': next(rates)}),
+                                      budget=settings.QUERY_BUDGETS['userbookrelation-detail'])
+
+    def test_userbookrelation_detail_create(self):
+        # no relation of the user to a freshly grown book yet, the upsert inserts it
+        self.assertQueryCountConstant(
+            lambda: self.send('patch', reverse('userbookrelation-detail', args=(self.books[-1].id,)),
+                              {'like': True, 'rate': 5}))
+
+    def test_userbookrelation_bulk(self):
+        url = reverse('userbookrelation-bulk')
+        rates = cycle([2, 3, 4])
+        self.assertQueryCountConstant(
+            lambda: self.send('post', url, [{'book': self.book.id, 'rate': next(rates)},
+                                            {'book': self.books[-1].id, 'like': True}]))
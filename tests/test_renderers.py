@@ -0,0 +1,82 @@
+import datetime
+import io
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from store.models import Book, UserBookRelation
+from store.renderers import ORJSONParser, ORJSONRenderer
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    data = {
+        'price': '125.00',
+        'raw_price': Decimal('125.50'),
+        'name': 'Книга\u2028"quoted"\u2029',
+        'created': datetime.datetime(2026, 10, 16, 20, 58, 23, 123456, tzinfo=datetime.timezone.utc),
+        'day': datetime.date(2026, 10, 16),
+        'errors': {0: {'rate': [ErrorDetail('"6" is not a valid choice.', code='invalid_choice')]}},
+        'lazy': gettext_lazy('This field is required.'),
+        'items': (1, 2.5, None, True),
+    }
+
+    def test_same_bytes(self):
+        self.assertEqual(JSONRenderer().render(self.data), ORJSONRenderer().render(self.data))
+        self.assertEqual(b'', ORJSONRenderer().render(None))
+
+    def test_indent(self):
+        rendered = ORJSONRenderer().render({'a': [1]}, 'application/json; indent=2')
+        self.assertEqual(JSONRenderer().render({'a': [1]}, 'application/json; indent=2'), rendered)
+
+    def test_without_orjson(self):
+        with mock.patch('store.renderers.orjson', None):
+            self.assertEqual(JSONRenderer().render(self.data), ORJSONRenderer().render(self.data))
+
+
+class ORJSONParserTestCase(SimpleTestCase):
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'})
+
+    def test_same_data(self):
+        body = '{"name": "Книга", "price": 125.5, "rate": 3, "like": true, "items": [null]}'.encode()
+        self.assertEqual(self.parse(JSONParser(), body), self.parse(ORJSONParser(), body))
+        with mock.patch('store.renderers.orjson', None):
+            self.assertEqual(self.parse(JSONParser(), body), self.parse(ORJSONParser(), body))
+
+    def test_errors(self):
+        for body in (b'{"rate": ', b'{"rate": NaN}', b'\xff'):
+            with self.assertRaises(ParseError):
+                self.parse(ORJSONParser(), body)
+
+
+class ORJSONApiTestCase(TestCase):
+    def test_book_list(self):
+        user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        book = Book.objects.create(name='Test book 1', price=125, discount=True, author_name='Author 1', owner=user)
+        UserBookRelation.objects.create(user=user, book=book, like=True, rate=4)
+        Book.objects.create(name='Test book 2', price='55.10', author_name='Author 2')
+
+        response = self.client.get(reverse('book-list'))
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(JSONRenderer().render(response.data), response.content)
+        self.assertIn(b'"price":"125.00","price_w_discount":"25.00"', response.content)
+        self.assertIn(b'"rating":"4.00"', response.content)
+
+    def test_parse_errors(self):
+        user = User.objects.create(username='test_username')
+        book = Book.objects.create(name='Test book 1', price=125, author_name='Author 1', owner=user)
+        self.client.force_login(user)
+        url = reverse('userbookrelation-detail', args=(book.id,))
+        response = self.client.patch(url, data='{"like": tru', content_type='application/json')
+        self.assertEqual(400, response.status_code)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error - '))
+        response = self.client.patch(url, data='{"like": true}', content_type='application/json')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(UserBookRelation.objects.get(user=user, book=book).like)
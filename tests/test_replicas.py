@@ -0,0 +1,91 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from store.models import Book
+from store.replicas import ReplicaRouter, is_pinned, pin_to_primary, primary_reads, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads(self):
+        self.assertIsNone(self.router.db_for_read(Book))
+        with replica_reads():
+            alias = self.router.db_for_read(Book)
+            self.assertIn(alias, ['replica_1', 'replica_2'])
+            # the same replica for the whole block
+            self.assertEqual({alias}, {self.router.db_for_read(User) for _ in range(20)})
+            with primary_reads():
+                self.assertIsNone(self.router.db_for_read(Book))
+        with replica_reads('replica_2'):
+            self.assertEqual('replica_2', self.router.db_for_read(Book))
+
+    def test_writes_and_migrations(self):
+        with replica_reads():
+            self.assertEqual('default', self.router.db_for_write(Book))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'store'))
+        self.assertIsNone(self.router.allow_migrate('default', 'store'))
+        with self.settings(DATABASE_REPLICAS=['default']):
+            self.assertIsNone(self.router.allow_migrate('default', 'store'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(Book))
+
+
+# the primary stands in for its replica, routed reads name it explicitly while primary reads return None
+@override_settings(DATABASE_REPLICAS=['default'], REPLICA_LAG_SECONDS=60)
+class ReplicaApiTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.user2 = User.objects.create(username='test_username2')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+
+    def reads(self, client, url):
+        # the aliases the router picked for the reads of a GET
+        results = []
+        original = ReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            results.append(original(router, model, **hints))
+            return results[-1]
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', db_for_read):
+            response = client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return set(results)
+
+    def test_safe_requests(self):
+        client = APIClient()
+        self.assertEqual({'default'}, self.reads(client, reverse('book-list')))
+        self.assertEqual({'default'}, self.reads(client, reverse('book-detail', args=(self.book.id,))))
+
+    def test_read_your_writes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(reverse('userbookrelation-detail', args=(self.book.id,)),
+                                data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(is_pinned(self.user))
+        self.assertEqual({None}, self.reads(client, reverse('book-list')))
+
+        # other users keep reading from replicas
+        other = APIClient()
+        other.force_authenticate(self.user2)
+        self.assertEqual({'default'}, self.reads(other, reverse('book-list')))
+
+    @override_settings(REPLICA_LAG_SECONDS=0)
+    def test_pin_expires(self):
+        pin_to_primary(self.user)
+        self.assertFalse(is_pinned(self.user))
@@ -1,9 +1,14 @@
+import random
+from decimal import Decimal
+
 from django.contrib.auth.models import User
 from django.db.models import Count, Case, When, Avg, F
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
 
 from store.models import Book, UserBookRelation
-from store.serializers import BooksSerializer
+from store.serializers import BooksSerializer, BooksRowSerializer
+from store.views import BookViewSet
 
 
 class BookSerializerTestCase(TestCase):
@@ -41,6 +46,7 @@ class BookSerializerTestCase(TestCase):
                 'annotated_likes': 3,
                 'rating': '4.67',
                 'owner_name': 'user1',
+                'readers_count': 3,
                 'readers': [
                     {
                         'first_name': 'Ivan',
@@ -65,6 +71,7 @@ class BookSerializerTestCase(TestCase):
                 'annotated_likes': 2,
                 'rating': '3.50',
                 'owner_name': None,
+                'readers_count': 3,
                 'readers': [
                     {
                         'first_name': 'Ivan',
@@ -83,3 +90,39 @@ class BookSerializerTestCase(TestCase):
         ]
         print(data)
         self.assertEqual(expected_data, data)
+
+
+class BooksRowSerializerTestCase(TestCase):
+    def setUp(self):
+        rng = random.Random(16)
+        users = [User.objects.create(username=f'user{i}', first_name=rng.choice(['Ivan', 'Петр', '']),
+                                     last_name=f'Last {i}') for i in range(15)]
+        for i in range(40):
+            book = Book.objects.create(name=f'Book "{i}" ё', price=Decimal(rng.randint(100, 99999)) / 100,
+                                       discount=rng.random() < 0.3, author_name=f'Author {rng.randint(1, 5)}',
+                                       owner=rng.choice(users + [None]))
+            for user in rng.sample(users, rng.randint(0, 6)):
+                UserBookRelation.objects.create(user=user, book=book, like=rng.random() < 0.5,
+                                                rate=rng.choice([None, 1, 2, 3, 4, 5]))
+
+    def test_same_output(self):
+        renderer = JSONRenderer()
+        queryset = BookViewSet.queryset.all()
+        rows = queryset.prefetch_related(None).values(*BooksRowSerializer.values)
+        book = queryset.last()
+        for mode, limit in (('aggregate', 3), ('aggregate', None), ('rows', 3), ('rows', None)):
+            with self.subTest(mode=mode, limit=limit), override_settings(BOOK_READERS_MODE=mode,
+                                                                         BOOK_READERS_LIMIT=limit):
+                self.assertEqual(renderer.render(BooksSerializer(queryset.all(), many=True).data),
+                                 renderer.render(BooksRowSerializer(rows, many=True).data))
+                self.assertEqual(renderer.render(BooksSerializer(book).data),
+                                 renderer.render(BooksRowSerializer(rows.get(pk=book.pk)).data))
+
+    @override_settings(BOOK_READERS_LIMIT=2)
+    def test_readers_limit(self):
+        data = BooksRowSerializer(BookViewSet.queryset.prefetch_related(None).values(*BooksRowSerializer.values),
+                                  many=True).data
+        counts = {book.pk: book.readers.count() for book in Book.objects.all()}
+        for book in data:
+            self.assertEqual(counts[book['id']], book['readers_count'])
+            self.assertEqual(min(counts[book['id']], 2), len(book['readers']))